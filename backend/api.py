@@ -1,16 +1,10 @@
 from flask import Flask, request, jsonify
 from simplifier_service.simplifier import NLPSimplifier
+from simplifier_service.structured_logging import configure_logging
 import logging
 
-#logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('app.log')
-    ]
-)
+#logging (JSON records to stdout and app.log, written by a background thread)
+configure_logging(log_file='app.log')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
@@ -0,0 +1,6 @@
+//settings shared by the server and its routes
+
+//how long to wait for a simplification; sent to the service too so it drops queued work we stopped waiting for
+const SIMPLIFY_TIMEOUT_MS = Number(process.env.SIMPLIFY_TIMEOUT_MS) || 30000;
+
+module.exports = { SIMPLIFY_TIMEOUT_MS };
@@ -1,6 +1,7 @@
 const express = require('express');
 const axios = require('axios');
 const { ClerkExpressRequireAuth } = require('@clerk/clerk-sdk-node');
+const { SIMPLIFY_TIMEOUT_MS } = require('../config');
 
 //creating a router object for simplify routes
 const router = express.Router();
@@ -31,20 +32,29 @@ router.post('/set-tier', async (req, res, next) => {
 
 //POST /api/simplify/simplify
 router.post('/simplify', async (req, res, next) => {
-    //get the text from the request body
-    const { text } = req.body;
+    //get the text (and optional latency budget, response format, document mode, fast mode and the user's difficult
+    //words) from the request body
+    const { text, deadline_ms, format, document, fast, difficult_words } = req.body;
     if (!text) {
         return res.status(400).json({ error: "Missing 'text' in request body" });
     }
     try {
         //forward the request to the Flask service
-        const response = await axios.post(`${SIMPLIFIER_SERVICE_URL}/simplify`, { text });
+        const response = await axios.post(`${SIMPLIFIER_SERVICE_URL}/simplify`, { text, deadline_ms, format, document, fast, difficult_words },
+            { timeout: SIMPLIFY_TIMEOUT_MS, headers: { 'X-Client-Timeout-Ms': SIMPLIFY_TIMEOUT_MS } });
         //send the response from the Flask service back to the frontend
         res.status(response.status).json(response.data);
     } catch (error) {
         console.error('Node backend: Error forwarding simplify request:', error.response ? error.response.data : error.message);
+        if (!error.response && error.code === 'ECONNABORTED') {
+            return res.status(504).json({ error: 'Simplifier service timed out' });
+        }
         const status = error.response ? error.response.status : 500;
         const message = error.response ? error.response.data : { error: 'Error communicating with simplifier service' };
+        //an overloaded simplifier says when to try again
+        if (error.response && error.response.headers['retry-after']) {
+            res.set('Retry-After', error.response.headers['retry-after']);
+        }
         res.status(status).json(message);
     }
 });
@@ -1,6 +1,7 @@
 const express = require('express');
 const { ClerkExpressRequireAuth } = require('@clerk/clerk-sdk-node');
 const { PrismaClient } = require('@prisma/client');
+const axios = require('axios');
 
 const prisma = new PrismaClient({
   datasources: {
@@ -10,6 +11,16 @@ const prisma = new PrismaClient({
   },
 });
 const router = express.Router();
+//base url for the simplifier service
+const SIMPLIFIER_SERVICE_URL = process.env.SIMPLIFIER_SERVICE_URL || 'http://localhost:5000';
+
+//helper function that asks the simplifier to pre-simplify the passages of a reading level
+//(the user's first daily exercise after the diagnostic is then served from its cache)
+//callers don't await it: the response never waits for the warm-up, and a failure is only logged
+function warmUpSimplifier(readingLevel) {
+  axios.post(`${SIMPLIFIER_SERVICE_URL}/warm-up`, { tier: readingLevel }, { timeout: 2000 })
+    .catch(error => console.warn(`Could not start simplifier warm-up for ${readingLevel}:`, error.message));
+}
 
 //helper function for streak calculation
 function calculateStreak(lastActivity) {
@@ -218,6 +229,7 @@ router.post('/diagnostic-complete', ClerkExpressRequireAuth(), async (req, res,
         updatedAt: new Date(),            
       },
     });
+    warmUpSimplifier(difficultyLevel);
     res.json(updatedStats);
   } catch (error) {
     console.error(`Error updating diagnostic results for user ${clerkUserId}:`, error);
@@ -489,6 +501,9 @@ router.post('/diagnostic-results', ClerkExpressRequireAuth(), async (req, res, n
                 speedScore
             }
         });
+        if (readingLevel) {
+            warmUpSimplifier(readingLevel);
+        }
         res.json(diagnosticResult);
     } catch (error) {
         console.error(`Error storing diagnostic results for user ${clerkUserId}:`, error);
@@ -5,6 +5,7 @@ const { ClerkExpressRequireAuth } = require('@clerk/clerk-sdk-node');
 const { PrismaClient } = require('@prisma/client');
 const userStatsRoutes = require('./routes/userStats');
 const simplifyRoutes = require('./routes/simplify'); 
+const { SIMPLIFY_TIMEOUT_MS } = require('./config');
 const prisma = new PrismaClient();
 const app = express();
 const port = process.env.PORT || 3001; 
@@ -31,6 +32,37 @@ app.use('/api/simplify', simplifyRoutes);
 // Get simplifier service URL from environment or default to localhost
 const SIMPLIFIER_SERVICE_URL = process.env.SIMPLIFIER_SERVICE_URL || 'http://localhost:5000';
 
+//applying the simplifier's edit list ({offset, length, replacement}) to the original text
+//the service counts offsets and lengths in code points (Python string indices), so the text is split into code points
+//rather than sliced by UTF-16 units, which would be off after an emoji or another character outside the BMP
+//edits are applied from the end so earlier offsets stay valid
+function applyEdits(text, edits) {
+  const chars = Array.from(text);
+  [...edits].sort((a, b) => b.offset - a.offset).forEach(edit => {
+    chars.splice(edit.offset, edit.length, edit.replacement);
+  });
+  return chars.join('');
+}
+
+//helper function that collects the words a user marked as difficult in their exercises
+//(the user's difficulty profile, sent to the simplifier with every simplification of their text)
+async function getDifficultWords(userId) {
+  const exercises = await prisma.exercise.findMany({
+    where: { clerkUserId: userId },
+    select: { difficultWords: true },
+  });
+  const words = new Set();
+  exercises.forEach(exercise => {
+    (exercise.difficultWords || '').split(',').forEach(word => {
+      const trimmed = word.trim().toLowerCase();
+      if (trimmed) {
+        words.add(trimmed);
+      }
+    });
+  });
+  return [...words].sort();
+}
+
 //route to get a daily exercise passage
 app.get('/api/exercises/daily', ClerkExpressRequireAuth(), async (req, res) => {
   const userId = req.auth.userId; //user id from clerk
@@ -83,9 +115,23 @@ app.get('/api/exercises/daily', ClerkExpressRequireAuth(), async (req, res) => {
     if (validPairs.length === 0) {
       return res.status(404).json({ error: `No passage pairs found in ${sourceFileName} with at least ${minWords} words.` });
     }
-    //selecting a random pair
-    const randomIndex = Math.floor(Math.random() * validPairs.length);
-    const selectedPair = validPairs[randomIndex];
+    //selecting a random pair, preferring passages the simplifier has already pre-simplified for this level
+    let candidatePairs = validPairs;
+    if (readingLevel === 'beginner' || readingLevel === 'intermediate') {
+      try {
+        const warmResponse = await axios.get(`${SIMPLIFIER_SERVICE_URL}/warm-passages`, { params: { tier: readingLevel }, timeout: 500 });
+        const warmPassages = new Set(warmResponse.data.passages || []);
+        const warmPairs = validPairs.filter(pair => warmPassages.has(pair.split('\n')[0].trim()));
+        if (warmPairs.length > 0) {
+          candidatePairs = warmPairs;
+        }
+      } catch (warmError) {
+        //the warm-up is only an optimization, any passage can still be simplified on demand
+        console.warn('Could not get warm passages from simplifier service:', warmError.message);
+      }
+    }
+    const randomIndex = Math.floor(Math.random() * candidatePairs.length);
+    const selectedPair = candidatePairs[randomIndex];
     const lines = selectedPair.split('\n');
     //extracting original (advanced) and simplified text
     const original_text = lines[0].trim();
@@ -104,11 +150,15 @@ app.get('/api/exercises/daily', ClerkExpressRequireAuth(), async (req, res) => {
         await axios.post(`${SIMPLIFIER_SERVICE_URL}/set-tier`, { tier: readingLevel });
         console.log(`Set simplifier tier to: ${readingLevel}`);
         
-        //simplifying the text
-        const simplifyResponse = await axios.post(`${SIMPLIFIER_SERVICE_URL}/simplify`, { text: original_text });
-        //checking if simplified text is returned
-        if (simplifyResponse.data && simplifyResponse.data.simplified_text) {
-          simplified_text = simplifyResponse.data.simplified_text;
+        //simplifying the text for this user's difficulty profile (only the list of edits is sent back, not both texts)
+        const difficultWords = await getDifficultWords(userId);
+        const simplifyResponse = await axios.post(`${SIMPLIFIER_SERVICE_URL}/simplify`,
+          { text: original_text, format: 'edits', difficult_words: difficultWords },
+          { timeout: SIMPLIFY_TIMEOUT_MS, headers: { 'X-Client-Timeout-Ms': SIMPLIFY_TIMEOUT_MS } });
+        //checking if edits are returned
+        if (simplifyResponse.data && Array.isArray(simplifyResponse.data.edits)) {
+          const edits = simplifyResponse.data.edits;
+          simplified_text = applyEdits(original_text, edits);
           simplification_type = `simplified-${readingLevel}`;
           
           //extracting simplification stats
@@ -119,26 +169,27 @@ app.get('/api/exercises/daily', ClerkExpressRequireAuth(), async (req, res) => {
           //logging the simplified text for reference on what the model is doing
           console.log(`\nsimplified text (${simplified_text.split(/\s+/).length} words):`);
           console.log(`"${simplified_text}"`);
-          //showing difference if words were replaced
+          //showing the replacements
           if (wordsReplaced > 0) {
             console.log(`\nword replacements:`);
-            // Compare original and simplified texts (basic implementation)
-            const originalWords = original_text.split(/\s+/);
-            const simplifiedWords = simplified_text.split(/\s+/);
-            if (originalWords.length === simplifiedWords.length) {
-              for (let i = 0; i < originalWords.length; i++) {
-                if (originalWords[i] !== simplifiedWords[i]) {
-                  console.log(`  "${originalWords[i]}" --> "${simplifiedWords[i]}"`);
-                }
-              }
-            }
+            edits.forEach(edit => {
+              console.log(`  "${edit.original}" --> "${edit.replacement}" (${edit.reason})`);
+            });
           }
         } else {
           return res.status(500).json({ error: 'Simplifier did not return simplified text. Returning error' });
         }
       } catch (simplifyError) {
-        console.error('Error calling simplifier service:', simplifyError.response ? simplifyError.response.data : simplifyError.message);
-        return res.status(500).json({ error: 'Error calling simplifier service' });
+        //when the simplifier is overloaded (503) or too slow, the corpus simplification of the passage is used instead
+        const overloaded = simplifyError.response ? simplifyError.response.status === 503 : simplifyError.code === 'ECONNABORTED';
+        if (overloaded) {
+          console.warn('Simplifier service busy, using the corpus simplification:', simplifyError.message);
+          simplified_text = data_simplified_text;
+          simplification_type = `data-${readingLevel}`;
+        } else {
+          console.error('Error calling simplifier service:', simplifyError.response ? simplifyError.response.data : simplifyError.message);
+          return res.status(500).json({ error: 'Error calling simplifier service' });
+        }
       }
     }
 
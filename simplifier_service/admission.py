@@ -0,0 +1,98 @@
+#admission control for the simplifier: a bounded queue in front of the simplifier lock
+#the simplifier runs one request at a time per process, the others wait for it. without a bound they wait until the
+#client has long given up, so under a spike latency grows without limit and the work is done for nobody. here:
+#  - at most max_queue requests wait; the next one is rejected right away (503 with a Retry-After estimate)
+#  - a request waits at most queue_timeout seconds, and never past the client's own deadline (the X-Client-Timeout-Ms
+#    header the backend sends), so work whose client is gone is dropped before it starts
+#the time an accepted request spends queued is then bounded by about max_queue * the time of one simplification
+import math
+import time
+import threading
+
+SERVICE_TIME_WEIGHT = 0.2 #weight of the newest simplification in the moving average used for Retry-After
+
+
+#raised when a request isn't admitted (queue full) or its queueing deadline passes before it gets the simplifier
+class Overloaded(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionControl:
+    #lock is the simplifier's PriorityLock, live requests go through admit()
+    def __init__(self, lock, max_queue=16, queue_timeout=10.0):
+        self.lock = lock
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.state_lock = threading.Lock()
+        self.queued = 0 #requests waiting for the simplifier
+        self.admitted = 0 #requests that got the simplifier
+        self.rejected = 0 #requests turned away because the queue was full
+        self.expired = 0 #requests whose queueing deadline passed while they waited
+        self.service_s = None #moving average of how long a request holds the simplifier
+
+    #this function estimates in how many seconds a retry could be admitted (for the Retry-After header)
+    def retry_after(self):
+        service_s = self.service_s or 1.0
+        return max(1, math.ceil(service_s * (self.queued + 1)))
+
+    #this function waits for the simplifier and returns a context that holds it
+    #client_deadline is a time.monotonic() value after which the client no longer waits (None if unknown)
+    #it raises Overloaded if the queue is full or the request can't get the simplifier in time
+    def admit(self, client_deadline=None):
+        with self.state_lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise Overloaded(f"Simplifier is overloaded ({self.queued} requests queued)", self.retry_after())
+            self.queued += 1
+        deadline = time.monotonic() + self.queue_timeout if self.queue_timeout is not None else None
+        if client_deadline is not None:
+            deadline = client_deadline if deadline is None else min(deadline, client_deadline)
+        try:
+            acquired = self.lock.acquire(timeout=max(deadline - time.monotonic(), 0) if deadline is not None else None)
+        finally:
+            with self.state_lock:
+                self.queued -= 1
+        with self.state_lock:
+            if not acquired:
+                self.expired += 1
+                raise Overloaded("Timed out waiting for the simplifier", self.retry_after())
+            self.admitted += 1
+        return _Admitted(self)
+
+    #this function updates the service time estimate (called when a request releases the simplifier)
+    def finished(self, elapsed_s):
+        with self.state_lock:
+            if self.service_s is None:
+                self.service_s = elapsed_s
+            else:
+                self.service_s += SERVICE_TIME_WEIGHT * (elapsed_s - self.service_s)
+
+    def stats(self):
+        with self.state_lock:
+            return {
+                "queue_depth": self.queued,
+                "max_queue": self.max_queue,
+                "queue_timeout_s": self.queue_timeout,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "expired": self.expired,
+                "service_ms": round(self.service_s * 1000, 1) if self.service_s is not None else None
+            }
+
+
+#holds the simplifier for an admitted request until the with block ends
+class _Admitted:
+    def __init__(self, control):
+        self.control = control
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.control.lock.release()
+        self.control.finished(time.monotonic() - self.start)
+        return False
@@ -1,9 +1,25 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 import os
+import json
+import gzip
+import time
 import logging
+from contextlib import nullcontext, contextmanager
 from flask_cors import CORS 
 from simplifier import NLPSimplifier
+from structured_logging import configure_logging
+from result_cache import ResultCache, result_key, snapshot_result, refresh_result
+from warmup import PriorityLock, PassageWarmer
+from profiling import RequestProfiler
+from singleflight import SingleFlight
+from admission import AdmissionControl, Overloaded
+from tuning import load_tuning, apply_tuning
+from shared_state import SHARED_DIR
 import nltk
+try:
+    import msgpack #optional encoding for the compact edit-list responses
+except ImportError:
+    msgpack = None
 nltk.download('punkt')
 nltk.download('punkt_tab')
 nltk.download('wordnet')
@@ -13,7 +29,13 @@ allowed_origins = os.environ.get('ALLOWED_ORIGINS', 'http://localhost:3000')
 origins = [origin.strip() for origin in allowed_origins.split(',')]
 CORS(app, resources={r"/*": {"origins": origins}})
 
-logging.basicConfig(level=logging.INFO)
+#JSON logs written by a background thread (see structured_logging.py for the SIMPLIFIER_LOG_* settings)
+configure_logging()
+#SIMPLIFIER_LOG_EVALUATION=1 logs the full evaluation of every simplification (otherwise only when a request
+#sends the X-Log-Evaluation: 1 header)
+log_evaluation = os.environ.get('SIMPLIFIER_LOG_EVALUATION', '0').lower() in ('1', 'true', 'yes')
+#SIMPLIFIER_FAST_MODE=1 makes fast mode (synonym index instead of the model) the default for /simplify
+fast_mode_default = os.environ.get('SIMPLIFIER_FAST_MODE', '0').lower() in ('1', 'true', 'yes')
 
 #initializing simplifier
 base_path = os.path.dirname(os.path.abspath(__file__))
@@ -30,16 +52,70 @@ else:
         if not os.path.exists(filepath):
             logging.warning(f"Expected data file for tier '{tier}' not found at {filepath}")
 
+#SIMPLIFIER_PRELOADED is set by gunicorn.conf.py when the app is loaded in the gunicorn master and the workers are
+#forked from it (SIMPLIFIER_PRELOAD=1). a worker forked from a process that has used torch's OpenMP threads hangs as
+#soon as it runs more than one thread (libgomp), so the master loads with a single torch thread and skips the
+#quantized model's agreement check, the one model run at load time; after_fork sets each worker's thread count
+preloaded = os.environ.get('SIMPLIFIER_PRELOADED', '0') == '1'
+
 #single instance of the simplifier
 try:
+    if preloaded:
+        import torch
+        torch.set_num_threads(1)
     beginner_path = tier_files.get('beginner')
     intermediate_path = tier_files.get('intermediate')
-    simplifier_instance = NLPSimplifier(adv_ele_path=beginner_path)
+    #SIMPLIFIER_LOW_MEMORY=1 uses the low-memory profile (quantized model, compact lexicons) so more workers fit on a node
+    low_memory = os.environ.get('SIMPLIFIER_LOW_MEMORY', '0').lower() in ('1', 'true', 'yes')
+    #SIMPLIFIER_STUB_MODEL=1 swaps the transformer for a deterministic stub (offline load tests, see loadtest.py)
+    stub_model = os.environ.get('SIMPLIFIER_STUB_MODEL', '0').lower() in ('1', 'true', 'yes')
+    #SIMPLIFIER_SHARED_WEIGHTS=1 memory-maps the model weights and lexicons from SIMPLIFIER_SHARED_DIR so the
+    #workers of a node share them (see shared_state.py)
+    shared_weights = os.environ.get('SIMPLIFIER_SHARED_WEIGHTS', '0').lower() in ('1', 'true', 'yes')
+    shared_dir = os.environ.get('SIMPLIFIER_SHARED_DIR', SHARED_DIR) if shared_weights else None
+    simplifier_instance = NLPSimplifier(adv_ele_path=beginner_path, low_memory=low_memory, stub_model=stub_model,
+                                        shared_dir=shared_dir, check_quantization=not preloaded)
+    #SIMPLIFIER_REFERENCES=0 turns off answering corpus sentences with their human simplification
+    simplifier_instance.use_references = os.environ.get('SIMPLIFIER_REFERENCES', '1').lower() in ('1', 'true', 'yes')
     current_tier = 'intermediate' 
+    #loading the word map that matches the starting tier (the lexicon fast path uses it)
+    simplifier_instance.set_simplification_tier(current_tier)
+    #torch threads and batch sizes for this machine (tuning.json written by autotune.py, see tuning.py)
+    tuning = load_tuning()
+    apply_tuning(simplifier_instance, tuning)
+    #worker processes for long documents: this worker's share of the cores (SIMPLIFIER_DOCUMENT_WORKERS overrides it)
+    document_workers = tuning["document_workers"]
 except Exception as e:
     logging.error(f"Failed to initialize NLPSimplifier: {e}", exc_info=True)
     simplifier_instance = None 
 
+#finished simplifications (SIMPLIFIER_RESULT_CACHE_SIZE entries, 0 turns the cache off)
+result_cache = ResultCache(int(os.environ.get('SIMPLIFIER_RESULT_CACHE_SIZE', 512)))
+#live requests and the background warm-up share the simplifier; live requests always go first
+simplifier_lock = PriorityLock()
+#bounded queue in front of the simplifier: at most SIMPLIFIER_MAX_QUEUE (default 16) requests wait for it and each
+#waits at most SIMPLIFIER_QUEUE_TIMEOUT seconds (default 10), the others get a 503 with Retry-After
+admission = AdmissionControl(simplifier_lock, max_queue=int(os.environ.get('SIMPLIFIER_MAX_QUEUE', 16)),
+                             queue_timeout=float(os.environ.get('SIMPLIFIER_QUEUE_TIMEOUT', 10)))
+#identical requests in flight at the same time share one simplification; a duplicate waits at most
+#SIMPLIFIER_COALESCE_TIMEOUT seconds (default 60) for the first one before running on its own
+in_flight = SingleFlight(timeout=float(os.environ.get('SIMPLIFIER_COALESCE_TIMEOUT', 60)))
+#pre-simplified passages kept ready per tier after a tier is set (SIMPLIFIER_WARM_WINDOW, 0 turns the warm-up off, as
+#does turning the result cache off)
+passage_warmer = PassageWarmer(simplifier_instance, simplifier_lock, result_cache, tier_files,
+                               window=int(os.environ.get('SIMPLIFIER_WARM_WINDOW', 8))) if simplifier_instance else None
+
+
+#called by gunicorn in each worker when the app was loaded once before forking (preload_app, see gunicorn.conf.py)
+#threads don't survive a fork, so the log writer thread is started again, and the torch threads are sized from the
+#worker count, which is only known now
+def after_fork():
+    global tuning
+    configure_logging()
+    if simplifier_instance:
+        tuning = load_tuning()
+        apply_tuning(simplifier_instance, tuning)
+
 #POST /set-tier
 @app.route('/set-tier', methods=['POST'])
 def set_tier_route():
@@ -53,8 +129,10 @@ def set_tier_route():
     if new_tier not in ['beginner', 'intermediate', 'advanced']: #if tier is not valid return error
         return jsonify({"error": f"Invalid tier: {new_tier}. Must be beginner, intermediate, or advanced."}), 400
     try:
-        simplifier_instance.set_simplification_tier(new_tier) #set the tier
-        current_tier = new_tier #keep track of the current state locally too
+        with simplifier_lock.live():
+            simplifier_instance.set_simplification_tier(new_tier) #set the tier
+            current_tier = new_tier #keep track of the current state locally too
+        passage_warmer.start(new_tier) #pre-simplifying the passages this tier's exercises come from
         return jsonify({"message": f"Tier set to {current_tier}"}), 200
     except AttributeError:
         logging.error(f"Method 'set_simplification_tier' not found on simplifier object.")
@@ -72,66 +150,161 @@ def simplify_route():
     if not data or 'text' not in data: #if no text in the request body return error
         return jsonify({"error": "Missing 'text' in request body"}), 400
     original_text = data['text'] #get the text from the request body
+    deadline_ms = data.get('deadline_ms') #optional latency budget in milliseconds
+    if deadline_ms is not None and (isinstance(deadline_ms, bool) or not isinstance(deadline_ms, (int, float)) or deadline_ms < 0):
+        return jsonify({"error": "'deadline_ms' must be a non-negative number"}), 400
+    #"edits" returns only the list of edits and the summary numbers instead of both full texts
+    response_format = data.get('format', request.args.get('format', 'full'))
+    if response_format not in ('full', 'edits'):
+        return jsonify({"error": f"Invalid format: {response_format}. Must be full or edits."}), 400
+    #"document": true simplifies paragraph by paragraph (in parallel) and keeps the line breaks of the text
+    document_mode = data.get('document', False)
+    if not isinstance(document_mode, bool):
+        return jsonify({"error": "'document' must be true or false"}), 400
+    #"fast": true picks replacements from the synonym index, without any model call
+    fast_mode = data.get('fast', fast_mode_default)
+    if not isinstance(fast_mode, bool):
+        return jsonify({"error": "'fast' must be true or false"}), 400
+    if fast_mode and simplifier_instance.synonym_index is None:
+        return jsonify({"error": "Fast mode is not available: the synonym index wasn't built (python synonym_index.py)"}), 503
+    #"difficult_words": the requesting user's difficulty profile, the words they marked as difficult in their exercises
+    #(the backend sends them with every request; nothing about a user is kept between requests)
+    difficult_words = data.get('difficult_words', [])
+    if not isinstance(difficult_words, list) or not all(isinstance(word, str) for word in difficult_words):
+        return jsonify({"error": "'difficult_words' must be a list of words"}), 400
+    difficult_words = frozenset(word.strip().lower() for word in difficult_words if word.strip())
+    #?profile=1 (or the X-Profile: 1 header) adds a timing breakdown and a decision record for every word,
+    #profile=cprofile also adds a cProfile summary
+    profile_mode = str(request.args.get('profile', request.headers.get('X-Profile', ''))).lower()
+    if profile_mode in ('', '0', 'false', 'no'):
+        profile_mode = None
+    elif profile_mode not in ('1', 'true', 'yes', 'cprofile'):
+        return jsonify({"error": f"Invalid profile mode: {profile_mode}. Must be 1 or cprofile."}), 400
+    #how long the client (the backend) waits for the answer; queued work is dropped once that has passed
+    client_timeout_ms = request.headers.get('X-Client-Timeout-Ms')
+    try:
+        client_deadline = time.monotonic() + float(client_timeout_ms) / 1000 if client_timeout_ms else None
+    except ValueError:
+        return jsonify({"error": "'X-Client-Timeout-Ms' must be a number"}), 400
+    #the latency budget counts from the request's arrival: time spent queued for the simplifier comes out of it, and
+    #the queue wait ends when the budget or the client's timeout runs out, whichever comes first
+    request_deadline = time.monotonic() + deadline_ms / 1000 if deadline_ms is not None else None
+    queue_deadline = min((d for d in (client_deadline, request_deadline) if d is not None), default=None)
     
-    logging.info(f"==== Simplification Request ====")
-    logging.info(f"Current tier: {current_tier}")
-    logging.info(f"Original text ({len(original_text.split())} words): {original_text[:100]}...")
+    start = time.perf_counter()
     
     #if the tier is advanced, return original text immediately (they don't need simplification anymore)
     if current_tier == 'advanced':
-        logging.info(f"Advanced tier - no simplification applied")
+        logging.info("simplify", extra={"route": "/simplify", "tier": current_tier, "total_words": len(original_text.split()),
+                                        "words_replaced": 0, "text": original_text})
+        if response_format == 'edits':
+            return compact_response({"tier": current_tier, "edits": [], "words_replaced": 0,
+                                     "total_words": len(original_text.split()), "simplification_percent": 0})
         return jsonify({"original_text": original_text, "simplified_text": original_text, "tier": current_tier}), 200
     try:
         #saving original tokenized words for comparison
         original_tokens = original_text.split()
-        #tracking replacements and total words checked
-        simplifier_instance.replacement_count = 0
-        simplifier_instance.total_words_checked = 0
-        #simplifying the text
-        simplified_text = simplifier_instance.simplify_text(original_text)
-        evaluation = simplifier_instance.evaluate_simplification(original_text, simplified_text)
-        
-        # Log evaluation metrics
-        logging.info("\n==== Simplification Evaluation ====")
-        logging.info("Original text metrics:")
-        logging.info(f"Flesch reading ease score: {evaluation['original_metrics']['flesch_reading_ease']:.2f} ({evaluation['original_metrics']['interpretation']})")
-        logging.info(f"Difficult word %: {evaluation['original_metrics']['difficult_word_percent']:.2f}%")
-        logging.info(f"Avg word length: {evaluation['original_metrics']['avg_word_length']:.2f}")
-        logging.info(f"Avg sentence length: {evaluation['original_metrics']['avg_sentence_length']:.2f}")
-
-        logging.info("\nSimplified text metrics:")
-        logging.info(f"Flesch reading ease score: {evaluation['simplified_metrics']['flesch_reading_ease']:.2f} ({evaluation['simplified_metrics']['interpretation']})")
-        logging.info(f"Difficult word %: {evaluation['simplified_metrics']['difficult_word_percent']:.2f}%")
-        logging.info(f"Avg word length: {evaluation['simplified_metrics']['avg_word_length']:.2f}")
-        logging.info(f"Avg sentence length: {evaluation['simplified_metrics']['avg_sentence_length']:.2f}")
-
-        logging.info("\nImprovement:")
-        logging.info(f"Flesch reading ease score: +{evaluation['flesch_reading_ease_diff']:.2f} points")
-        logging.info(f"Difficult word reduction: {evaluation['difficult_word_percent_diff']:.2f}%")
-        logging.info(f"Avg word length reduction: {evaluation['avg_word_length_diff']:.2f}")
-        logging.info(f"Avg sentence length reduction: {evaluation['avg_sentence_length_diff']:.2f}")
-        logging.info(f"Text length reduction: {evaluation['sentence_len_reduction_pct']:.2f}%")
+        tier = current_tier
+        #without a difficulty gate the profile doesn't change the result, so every user shares the profile-less entry
+        #(and the warm-up's)
+        profile_key = difficult_words if simplifier_instance.gate_active(tier) else frozenset()
+        cache_key = result_key(tier, original_text, document_mode, fast_mode, profile_key)
+        #profiled requests always run the simplifier (there is nothing to profile in a cache hit)
+        profiler = RequestProfiler(simplifier_instance, use_cprofile=profile_mode == 'cprofile') if profile_mode else None
+        result = result_cache.get(cache_key) if not profiler else None
+        base = None
+        if result is None and profile_key and not profiler:
+            base = result_cache.get(result_key(tier, original_text, document_mode, fast_mode))
+        if base is not None and base.get("records"):
+            #the text was simplified without a profile (e.g. by the warm-up): only the sentences containing one of
+            #the user's words are redone (results without sentence records, like documents, are simplified again)
+            with admission.admit(queue_deadline), simplifier_mode(fast_mode, difficult_words):
+                result = refresh_result(simplifier_instance, base)
+            if result is not None:
+                result_cache.put(cache_key, result)
+        cached = result is not None
+        coalesced = False
+        if cached:
+            passage_warmer.mark_served(tier, original_text) #the warm-up replaces it with a new passage
+        elif profiler:
+            result = run_simplifier(original_text, document_mode, request_deadline, fast_mode, queue_deadline, profiler,
+                                    difficult_words)
+        else:
+            #the same request already being simplified is waited for instead of simplified again
+            result, coalesced = in_flight.do((cache_key, deadline_ms), lambda: run_simplifier(
+                original_text, document_mode, request_deadline, fast_mode, queue_deadline, difficult_words=difficult_words))
+        #results cut short by a deadline aren't cached (and a shared result was cached by the first request)
+        if not cached and not coalesced and deadline_ms is None:
+            result_cache.put(cache_key, result)
+        simplified_text = result["simplified_text"]
+        request_stats = with_memo_hit_rate(result["request_stats"])
+        #the simplifier is released by now and may hold another request's profile, so this user's is passed
+        evaluation = simplifier_instance.evaluate_simplification(original_text, simplified_text, difficult_words)
         
         #calculating simplification stats
-        replacement_count = getattr(simplifier_instance, 'replacement_count', 0)
+        replacement_count = result["replacement_count"]
         total_words = len(original_tokens)
         #calculating percentage of words that were simplified
         if total_words > 0:
             simplification_percent = (replacement_count / total_words) * 100
-            logging.info(f"Simplification result: {replacement_count}/{total_words} words simplified ({simplification_percent:.1f}%)")
-            logging.info(f"Simplified: {simplified_text[:100]}...")
         else:
             simplification_percent = 0
-            logging.info("No words to simplify")
+        #one record per request (sampled per route, text fields are cut to SIMPLIFIER_LOG_MAX_FIELD)
+        logging.info("simplify", extra={
+            "route": "/simplify",
+            "tier": current_tier,
+            "document": document_mode,
+            "fast": fast_mode,
+            "total_words": total_words,
+            "words_replaced": replacement_count,
+            "simplification_percent": round(simplification_percent, 1),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+            "cached": cached,
+            "coalesced": coalesced,
+            "request_stats": request_stats,
+            "text": original_text
+        })
+        #the full evaluation is only logged on demand (never sampled out)
+        if log_evaluation or request.headers.get('X-Log-Evaluation') == '1':
+            logging.info("simplification evaluation", extra={
+                "route": "/simplify",
+                "always_log": True,
+                "text": original_text,
+                "simplified_text": simplified_text,
+                "original_metrics": evaluation["original_metrics"],
+                "simplified_metrics": evaluation["simplified_metrics"],
+                "improvement": {key: evaluation[key] for key in (
+                    "flesch_reading_ease_diff", "difficult_word_percent_diff", "avg_word_length_diff",
+                    "avg_sentence_length_diff", "sentence_len_reduction_pct")}
+            })
+
+        if response_format == 'edits':
+            response = {
+                "tier": current_tier,
+                "edits": simplifier_instance.compute_edits(original_text, simplified_text, result["replacement_reasons"]),
+                "simplification_percent": round(simplification_percent, 1),
+                "words_replaced": replacement_count,
+                "total_words": total_words,
+                "skipped_words": result["skipped_words"],
+                "request_stats": request_stats,
+                "improvement": {key: round(float(evaluation[key]), 2) for key in (
+                    "flesch_reading_ease_diff", "difficult_word_percent_diff", "avg_word_length_diff",
+                    "avg_sentence_length_diff", "sentence_len_reduction_pct")}
+            }
+            if profiler:
+                response["profile"] = profiler.report()
+            return compact_response(response)
             
         # Include evaluation metrics in the response
-        return jsonify({
+        response = {
             "original_text": original_text, 
             "simplified_text": simplified_text, 
             "tier": current_tier,
             "simplification_percent": round(simplification_percent, 1),
             "words_replaced": replacement_count,
             "total_words": total_words,
+            "skipped_words": result["skipped_words"],
+            "request_stats": request_stats,
             "evaluation_metrics": {
                 "original_metrics": evaluation["original_metrics"],
                 "simplified_metrics": evaluation["simplified_metrics"],
@@ -143,17 +316,113 @@ def simplify_route():
                     "sentence_len_reduction_pct": evaluation["sentence_len_reduction_pct"]
                 }
             }
-        }), 200
+        }
+        if profiler:
+            response["profile"] = profiler.report()
+        return jsonify(response), 200
+    except Overloaded as e:
+        #rejected quickly so the client can back off instead of waiting
+        logging.warning("simplify rejected", extra={"route": "/simplify", "reason": str(e), "queue": admission.stats()})
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
     except Exception as e:
         logging.error(f"Failed to simplify text: {e}", exc_info=True)
         return jsonify({"error": f"Failed to simplify text: {e}"}), 500
 
+#POST /warm-up
+#starts pre-simplifying the passages of a tier without changing the current tier (e.g. right after the diagnostic)
+@app.route('/warm-up', methods=['POST'])
+def warm_up_route():
+    if not simplifier_instance: #if no simplifier instance return error
+        return jsonify({"error": "Simplifier not initialized"}), 500
+    data = request.get_json(silent=True)
+    if not data or 'tier' not in data:
+        return jsonify({"error": "Missing 'tier' in request body"}), 400
+    tier = str(data['tier']).lower()
+    if tier not in ['beginner', 'intermediate', 'advanced']:
+        return jsonify({"error": f"Invalid tier: {tier}. Must be beginner, intermediate, or advanced."}), 400
+    started = passage_warmer.start(tier) #advanced texts aren't simplified so there is nothing to warm up
+    return jsonify({"tier": tier, "warming": started}), 202
+
+#GET /warm-passages?tier=beginner
+#lists the passages of a tier that are already simplified (the daily exercise prefers these)
+@app.route('/warm-passages', methods=['GET'])
+def warm_passages_route():
+    if not simplifier_instance: #if no simplifier instance return error
+        return jsonify({"error": "Simplifier not initialized"}), 500
+    tier = request.args.get('tier', current_tier).lower()
+    return jsonify({"tier": tier, "passages": passage_warmer.warm_passages(tier)})
+
+#this function simplifies a request's text and returns the result (as stored in the result cache)
+#(it waits in the admission queue for the simplifier until queue_deadline, see admission.py; both deadlines are
+#time.monotonic() values, None without one)
+def run_simplifier(original_text, document_mode, request_deadline, fast_mode, queue_deadline=None, profiler=None,
+                   difficult_words=frozenset()):
+    with admission.admit(queue_deadline), simplifier_mode(fast_mode, difficult_words), (profiler or nullcontext()):
+        #what is left of the latency budget once the request has the simplifier
+        deadline_ms = max((request_deadline - time.monotonic()) * 1000, 0) if request_deadline is not None else None
+        #tracking replacements and total words checked
+        simplifier_instance.replacement_count = 0
+        simplifier_instance.total_words_checked = 0
+        #simplifying the text
+        if document_mode:
+            #a profiled document stays in this process so every decision is recorded
+            workers = 1 if profiler else document_workers
+            simplified_text = simplifier_instance.simplify_document(original_text, workers=workers, deadline_ms=deadline_ms)
+            return snapshot_result(simplifier_instance, simplified_text)
+        if deadline_ms is not None:
+            return snapshot_result(simplifier_instance, simplifier_instance.simplify_text(original_text, deadline_ms=deadline_ms))
+        #keeping the sentence records so another profile only redoes the affected sentences
+        simplified_text, records = simplifier_instance.simplify_text_with_records(original_text)
+        return snapshot_result(simplifier_instance, simplified_text, records)
+
+#this context sets fast mode and the user's difficulty profile for one request (the caller holds the simplifier lock)
+#the profile is cleared afterwards so it never leaks into another user's request or the warm-up
+@contextmanager
+def simplifier_mode(fast, difficult_words=frozenset()):
+    simplifier_instance.fast_mode = fast
+    simplifier_instance.load_user_difficulty_profile({word: 1.0 for word in difficult_words})
+    try:
+        yield
+    finally:
+        simplifier_instance.fast_mode = False
+        simplifier_instance.load_user_difficulty_profile({})
+
+#this function adds the decision memo's hit rate to the request stats
+def with_memo_hit_rate(request_stats):
+    stats = dict(request_stats)
+    lookups = stats.get("memo_lookups", 0)
+    stats["memo_hit_rate"] = round(stats.get("memo_hits", 0) / lookups, 3) if lookups else 0.0
+    return stats
+
+#this function encodes a compact response: msgpack if the client accepts it (and msgpack is installed),
+#otherwise JSON without extra whitespace, gzipped if the client accepts gzip
+def compact_response(payload, status=200):
+    accept = request.headers.get('Accept', '')
+    if msgpack is not None and ('application/msgpack' in accept or 'application/x-msgpack' in accept):
+        body = msgpack.packb(payload, use_bin_type=True)
+        mimetype = 'application/msgpack'
+    else:
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        mimetype = 'application/json'
+    response = Response(body, status=status, mimetype=mimetype)
+    if 'gzip' in request.headers.get('Accept-Encoding', '').lower():
+        response.set_data(gzip.compress(body))
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    return response
+
 #GET /health
 @app.route('/health', methods=['GET'])
 def health_check():
     status = {"status": "ok", "simplifier_initialized": simplifier_instance is not None}
     if simplifier_instance:
         status["current_tier"] = current_tier
+        status["memory"] = simplifier_instance.memory_report()
+        status["result_cache"] = result_cache.stats()
+        status["warm_passages"] = passage_warmer.stats()
+        status["tuning"] = tuning
+        status["single_flight"] = in_flight.stats()
+        status["admission"] = admission.stats()
     return jsonify(status)
 
 #running app
@@ -0,0 +1,157 @@
+#autotuner for the serving settings of the current machine
+#it starts the service under gunicorn for each configuration (with loadtest.py's helpers), replays the load test
+#passages against /simplify and keeps the configuration with the highest throughput whose p95 latency is within
+#the target. instead of every combination it tunes one group of settings at a time, keeping the best so far:
+#  1. gunicorn workers x torch threads per worker (only combinations that fit on the cores)
+#  2. inference batch size (masked sentences per fill-mask call)
+#  3. spaCy batch size (sentences per spaCy pipe batch)
+#the result is written to tuning.json, which gunicorn.conf.py and app.py read at boot (see tuning.py)
+#the result cache and the warm-up are turned off while measuring, otherwise repeated passages would be cache hits
+#
+#e.g. python autotune.py --target-p95 800 --duration 20
+#     python autotune.py --stub --workers 1,2 --inference-batch 1,8 --duration 5
+import os
+import sys
+import argparse
+import platform
+from datetime import datetime, timezone
+from loadtest import load_payloads, run_load, free_port, wait_until_ready, start_service, stop_service, int_list
+from tuning import TUNING_FILE, save_tuning
+
+MAX_ERROR_RATE = 0.01 #configurations failing more requests than this are not recommended
+
+
+#this function returns 1, 2, 4, ... up to limit (and limit itself)
+def powers_of_two(limit):
+    values = []
+    value = 1
+    while value < limit:
+        values.append(value)
+        value *= 2
+    values.append(max(limit, 1))
+    return values
+
+
+#this function starts the service with the given settings, runs the load and returns the /simplify results
+#(None if the service didn't come up)
+def measure(settings, payloads, args):
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    env = {
+        'SIMPLIFIER_TORCH_THREADS': str(settings["torch_threads"]),
+        'SIMPLIFIER_SPACY_BATCH': str(settings["spacy_batch_size"]),
+        'SIMPLIFIER_INFERENCE_BATCH': str(settings["inference_batch_size"]),
+        'SIMPLIFIER_RESULT_CACHE_SIZE': '0',
+        'SIMPLIFIER_WARM_WINDOW': '0',
+        #the payloads are corpus sentences, which the reference index would answer without the pipeline
+        'SIMPLIFIER_REFERENCES': '0'
+    }
+    #enough clients to keep every worker thread busy (and queue a little)
+    clients = settings["workers"] * settings["threads"] * args.clients_per_worker
+    mix = {'/simplify': 1.0}
+    process = start_service(settings["workers"], settings["threads"], args.stub, port, env)
+    try:
+        if not wait_until_ready(base_url, args.boot_timeout):
+            print(f"service did not become ready with {settings}", file=sys.stderr)
+            return None
+        if args.warmup:
+            run_load(base_url, payloads, clients, args.warmup, mix, args.timeout)
+        stats = run_load(base_url, payloads, clients, args.duration, mix, args.timeout)['/simplify']
+    finally:
+        stop_service(process)
+    return dict(settings, clients=clients, **stats)
+
+
+#this function picks the run with the highest throughput within the p95 target
+#if no run meets the target, the one with the lowest p95 is the best there is
+def best_run(runs, target_p95):
+    usable = [run for run in runs if run["p95_ms"] is not None and run["error_rate"] <= MAX_ERROR_RATE]
+    within = [run for run in usable if run["p95_ms"] <= target_p95]
+    if within:
+        return max(within, key=lambda run: run["throughput_rps"])
+    return min(usable, key=lambda run: run["p95_ms"]) if usable else None
+
+
+#this function prints one line per run
+def print_run(run, target_p95):
+    print(f"{run['workers']:>7} {run['threads']:>7} {run['torch_threads']:>6} {run['inference_batch_size']:>6} "
+          f"{run['spacy_batch_size']:>6} {run['clients']:>7} {run['throughput_rps']:>9} {str(run['p95_ms']):>9} "
+          f"{run['error_rate']:>7.2%} {'' if run['p95_ms'] is not None and run['p95_ms'] <= target_p95 else ' over target'}")
+
+
+def main(argv=None):
+    cpu_count = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Find the serving settings with the most throughput within a p95 latency target")
+    parser.add_argument('--target-p95', type=float, default=1000, help="p95 latency target of /simplify in ms")
+    parser.add_argument('--workers', type=int_list, default=powers_of_two(cpu_count), help="gunicorn worker counts to try")
+    parser.add_argument('--threads', type=int_list, default=[1], help="gunicorn thread counts to try")
+    parser.add_argument('--torch-threads', type=int_list, default=powers_of_two(cpu_count), help="torch threads per worker to try")
+    parser.add_argument('--inference-batch', type=int_list, default=[1, 4, 8, 16], help="fill-mask batch sizes to try")
+    parser.add_argument('--spacy-batch', type=int_list, default=[1, 8, 32], help="spaCy pipe batch sizes to try")
+    parser.add_argument('--clients-per-worker', type=int, default=2, help="parallel clients per worker thread")
+    parser.add_argument('--duration', type=float, default=20, help="measured seconds per configuration")
+    parser.add_argument('--warmup', type=float, default=5, help="seconds of unmeasured traffic before each run")
+    parser.add_argument('--stub', action='store_true', help="use the deterministic stub model (checks the tuner, not the real costs)")
+    parser.add_argument('--timeout', type=float, default=60, help="client timeout in seconds")
+    parser.add_argument('--boot-timeout', type=float, default=600, help="seconds to wait for the service to load")
+    parser.add_argument('--limit', type=int, default=None, help="only use the first N payloads")
+    parser.add_argument('--output', default=TUNING_FILE, help="where to write the recommended settings")
+    args = parser.parse_args(argv)
+
+    payloads = load_payloads(limit=args.limit)
+    if not payloads:
+        parser.error("no payloads found in data/")
+    runs = []
+    measured = {} #settings -> run, so the best configuration of a stage isn't measured again in the next one
+
+    def try_settings(candidates):
+        stage_runs = []
+        for settings in candidates:
+            key = tuple(sorted(settings.items()))
+            if key not in measured:
+                measured[key] = measure(settings, payloads, args)
+                if measured[key]:
+                    runs.append(measured[key])
+                    print_run(measured[key], args.target_p95)
+            if measured[key]:
+                stage_runs.append(measured[key])
+        return best_run(stage_runs, args.target_p95)
+
+    print(f"{'workers':>7} {'threads':>7} {'torch':>6} {'infer':>6} {'spacy':>6} {'clients':>7} {'rps':>9} {'p95 ms':>9} {'errors':>7}")
+    #stage 1: workers x torch threads (x gunicorn threads), batching off
+    base = {"spacy_batch_size": 1, "inference_batch_size": 1}
+    best = try_settings([dict(base, workers=w, threads=t, torch_threads=tt)
+                         for w in args.workers for t in args.threads for tt in args.torch_threads
+                         if w * tt <= cpu_count or tt == 1])
+    if best is None:
+        print("no configuration could be measured", file=sys.stderr)
+        return None
+    #stages 2 and 3: the batch sizes, one at a time
+    for key, values in (("inference_batch_size", args.inference_batch), ("spacy_batch_size", args.spacy_batch)):
+        settings = {name: best[name] for name in ("workers", "threads", "torch_threads", "spacy_batch_size", "inference_batch_size")}
+        best = try_settings([dict(settings, **{key: value}) for value in values] + [settings])
+
+    tuning = {name: best[name] for name in ("workers", "threads", "torch_threads", "spacy_batch_size", "inference_batch_size")}
+    tuning.update({
+        "target_p95_ms": args.target_p95,
+        "within_target": best["p95_ms"] <= args.target_p95,
+        "measured": {key: best[key] for key in ("clients", "requests", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "error_rate")},
+        "created": datetime.now(timezone.utc).isoformat(),
+        "machine": {"cpu_count": cpu_count, "platform": platform.platform(), "python": platform.python_version()},
+        "stub_model": args.stub,
+        "runs": runs
+    })
+    #(the difficulty gates evaluate.py wrote to the file are kept)
+    save_tuning(tuning, args.output)
+    print()
+    if not tuning["within_target"]:
+        print(f"no configuration met the p95 target of {args.target_p95} ms, recommending the fastest one", file=sys.stderr)
+    print(f"recommended: workers={tuning['workers']} threads={tuning['threads']} torch_threads={tuning['torch_threads']} "
+          f"inference_batch_size={tuning['inference_batch_size']} spacy_batch_size={tuning['spacy_batch_size']} "
+          f"({tuning['measured']['throughput_rps']} rps, p95 {tuning['measured']['p95_ms']} ms)")
+    print(f"written to {args.output}")
+    return tuning
+
+
+if __name__ == '__main__':
+    main()
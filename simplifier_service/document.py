@@ -0,0 +1,149 @@
+#document mode: simplifying long texts (e.g. the comprehension articles) paragraph by paragraph
+#the text is split at its line breaks (which are kept, so the output has the same layout), the paragraphs are grouped
+#into chunks of about the same number of words and the chunks are simplified in parallel in forked worker processes
+#the workers inherit the loaded simplifier (models, word map) from the parent, so nothing is loaded or pickled again
+#the minimum replacement percentage is not enforced per paragraph, the caller enforces it once for the whole document
+import os
+import re
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+PARAGRAPH_BREAK = re.compile(r'(\s*\n\s*)') #line breaks and the whitespace around them
+MIN_PARALLEL_WORDS = 300 #below this many words forking the workers costs more than it saves
+CHUNKS_PER_WORKER = 2 #more chunks than workers so a slow chunk doesn't hold up the others
+MAX_POOLS = 1 #worker pools a process runs at the same time (another long document waits for the pool)
+
+_pool_slots = threading.BoundedSemaphore(MAX_POOLS)
+
+_worker_simplifier = None
+
+
+#this function splits a text at its line breaks
+#it returns the paragraphs and the separators between them (len(separators) == len(paragraphs) - 1)
+def split_paragraphs(text):
+    parts = PARAGRAPH_BREAK.split(text)
+    return parts[0::2], parts[1::2]
+
+
+#this function puts the paragraphs back together with the original separators
+def join_paragraphs(paragraphs, separators):
+    parts = [paragraphs[0]] if paragraphs else []
+    for separator, paragraph in zip(separators, paragraphs[1:]):
+        parts.append(separator)
+        parts.append(paragraph)
+    return ''.join(parts)
+
+
+#this function groups the non-empty paragraphs into about `chunks` runs of consecutive paragraphs
+#with about the same number of words
+#it returns lists of paragraph indices
+def chunk_paragraphs(paragraphs, chunks):
+    indices = [idx for idx, paragraph in enumerate(paragraphs) if paragraph.strip()]
+    total_words = sum(len(paragraphs[idx].split()) for idx in indices)
+    target = total_words / max(chunks, 1)
+    groups = []
+    current = []
+    current_words = 0
+    for idx in indices:
+        current.append(idx)
+        current_words += len(paragraphs[idx].split())
+        if current_words >= target:
+            groups.append(current)
+            current = []
+            current_words = 0
+    if current:
+        groups.append(current)
+    return groups
+
+
+#this function returns empty counters for merging the per-paragraph results
+def new_counters():
+    return {
+        "replacement_count": 0,
+        "total_words_checked": 0,
+        "request_stats": {},
+        "replacement_reasons": {},
+        "skipped_words": []
+    }
+
+
+#this function adds the counters of one simplify_text call (or of a whole chunk) to `counters`
+def merge_counters(counters, other):
+    counters["replacement_count"] += other["replacement_count"]
+    counters["total_words_checked"] += other["total_words_checked"]
+    for key, value in other["request_stats"].items():
+        counters["request_stats"][key] = counters["request_stats"].get(key, 0) + value
+    counters["replacement_reasons"].update(other["replacement_reasons"])
+    counters["skipped_words"].extend(other["skipped_words"])
+
+
+#this function simplifies a list of paragraphs one after the other (without the minimum replacement pass)
+#the paragraphs of a chunk share one decision memo, so a word repeated in the chunk gets the same replacement
+#(the memo starts empty for every chunk, so the result doesn't depend on which worker got which chunk)
+#deadline is an absolute time.monotonic() value or None (the monotonic clock is shared by all processes)
+def simplify_chunk(simplifier, paragraphs, deadline=None):
+    simplified = []
+    counters = new_counters()
+    simplifier.decision_memo = {}
+    for paragraph in paragraphs:
+        deadline_ms = None if deadline is None else max(deadline - time.monotonic(), 0) * 1000
+        simplified.append(simplifier.simplify_text(paragraph, deadline_ms=deadline_ms, enforce_minimum=False, new_document=False))
+        merge_counters(counters, {
+            "replacement_count": simplifier.replacement_count,
+            "total_words_checked": simplifier.total_words_checked,
+            "request_stats": simplifier.request_stats,
+            "replacement_reasons": simplifier.replacement_reasons,
+            "skipped_words": simplifier.skipped_words
+        })
+    return simplified, counters
+
+
+#runs in the worker processes: keeps the simplifier inherited from the parent
+#the model runs single-threaded in a worker: the parent has already used torch's OpenMP thread pool, and a forked
+#child that starts a parallel region with more than one thread hangs in libgomp (the workers give the parallelism)
+def _init_worker(simplifier):
+    global _worker_simplifier
+    _worker_simplifier = simplifier
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+
+
+def _simplify_chunk_in_worker(paragraphs, deadline):
+    return simplify_chunk(_worker_simplifier, paragraphs, deadline)
+
+
+#this function simplifies all paragraphs, in parallel in up to `workers` processes if the document is long enough
+#(workers defaults to all cores; the service passes its share of them, see tuning.py)
+#it returns the simplified paragraphs (same order and count, empty ones unchanged) and the merged counters
+def simplify_paragraphs(simplifier, paragraphs, workers=None, deadline=None):
+    total_words = sum(len(paragraph.split()) for paragraph in paragraphs)
+    if total_words < MIN_PARALLEL_WORDS:
+        workers = 1
+    elif workers is None:
+        workers = os.cpu_count() or 1
+    groups = chunk_paragraphs(paragraphs, workers * CHUNKS_PER_WORKER)
+    workers = min(workers, len(groups))
+    #forking is what lets the workers share the loaded models, so without it we stay serial
+    if workers <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        groups = [[idx for group in groups for idx in group]]
+        results = [simplify_chunk(simplifier, [paragraphs[idx] for idx in groups[0]], deadline)]
+    else:
+        with _pool_slots, ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+                                              initializer=_init_worker, initargs=(simplifier,)) as pool:
+            futures = [pool.submit(_simplify_chunk_in_worker, [paragraphs[idx] for idx in group], deadline)
+                       for group in groups]
+            results = [future.result() for future in futures]
+
+    simplified = list(paragraphs)
+    counters = new_counters()
+    #merging in document order so the counters (e.g. skipped words) come out like a serial run
+    for group, (chunk_simplified, chunk_counters) in zip(groups, results):
+        for idx, paragraph in zip(group, chunk_simplified):
+            simplified[idx] = paragraph
+        merge_counters(counters, chunk_counters)
+    return simplified, counters
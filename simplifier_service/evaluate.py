@@ -0,0 +1,289 @@
+#offline quality vs latency evaluation of the simplifier against the human simplifications in the aligned corpora
+#every k-th pair of ADV-ELE.txt/ADV-INT.txt is held out; the word map is built from the other pairs only, so the
+#lexicon doesn't just look up the answers. each configuration simplifies the advanced sentences of the held-out pairs,
+#the one-word substitutions it makes are compared with the ones in the reference sentence, and the readability deltas
+#(evaluate_simplification), latency and model calls are recorded. configurations that no other configuration beats on
+#both latency and substitution F1 are marked as the Pareto front
+#
+#--tune-gates also tries a grid of difficulty gates and writes the gate that saves the most model calls without losing
+#more than --max-f1-loss of the ungated F1 to tuning.json (the service reads it at boot, see tuning.py)
+#
+#e.g. python evaluate.py --tier beginner --limit 200
+#     python evaluate.py --tier intermediate --configs gated,lexicon-only,quantized --report evaluation.json
+#     python evaluate.py --tier intermediate --configs ungated --tune-gates
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+from datetime import datetime, timezone
+from word_map_builder import iter_corpus_pairs, align_pairs
+from loadtest import percentile
+from tuning import load_tuning, read_tuning_file, save_tuning, NO_GATE
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(BASE_PATH, 'data')
+TIER_FILES = {'beginner': ('adv-ele', 'ADV-ELE.txt'), 'intermediate': ('adv-int', 'ADV-INT.txt')}
+
+#configurations that can be compared (name -> settings applied for the run, see apply_configuration)
+CONFIGURATIONS = {
+    'gated': {'gate': 'tuned'}, #the service's gate for the tier (tuning.json / SIMPLIFIER_GATE_*)
+    'ungated': {'gate': False}, #every candidate word may go to the model
+    'lexicon-only': {'lexicon_only': True}, #only the word map: no model calls and no forced pass
+    'top_k=5': {'top_k': 5},
+    'top_k=30': {'top_k': 30},
+    'quantized': {'quantized': True}, #int8 dynamic quantization of the model's linear layers
+    'batched': {'inference_batch_size': 8, 'spacy_batch_size': 16}, #batched model calls and spaCy parses
+    'fast': {'fast': True}, #synonym index instead of the model (needs python synonym_index.py first)
+}
+#difficulty gates tried by --tune-gates (every min_score with every top_fraction)
+GATE_MIN_SCORES = [5.0, 6.0, 7.0, 8.0, 9.0, 10.0]
+GATE_TOP_FRACTIONS = [None, 0.5]
+
+
+#this function splits the pairs of a corpus file into training pairs and held-out pairs (every k-th pair)
+def split_pairs(file_path, holdout_every=20, min_words=5):
+    train, held_out = [], []
+    for number, (adv_sent, ele_sent, _) in enumerate(iter_corpus_pairs(file_path)):
+        if number % holdout_every == holdout_every - 1 and len(adv_sent.split()) >= min_words:
+            held_out.append((adv_sent, ele_sent))
+        else:
+            train.append((adv_sent, ele_sent))
+    return train, held_out
+
+
+#this function writes pairs in the corpus file format (so the word map can be built from them)
+def write_pairs(pairs, file_path):
+    with open(file_path, 'w', encoding='utf-8') as f:
+        for adv_sent, ele_sent in pairs:
+            f.write(f"{adv_sent}\n{ele_sent}\n*****\n")
+
+
+#this function gets the one-word substitutions between a sentence and its simplification
+#(same alignment as the word map: lowercase, no function words, no punctuation)
+def substitutions(original, simplified, function_words):
+    return set(align_pairs([(original, simplified)], function_words))
+
+
+#this function applies a configuration to the simplifier and returns a function that undoes it
+def apply_configuration(simplifier, settings):
+    undo = []
+    if 'top_k' in settings:
+        previous_top_k = simplifier.model_top_k
+        simplifier.model_top_k = settings['top_k']
+        undo.append(lambda: setattr(simplifier, 'model_top_k', previous_top_k))
+    for name in ('inference_batch_size', 'spacy_batch_size'):
+        if name in settings:
+            previous = getattr(simplifier, name)
+            setattr(simplifier, name, settings[name])
+            undo.append(lambda name=name, previous=previous: setattr(simplifier, name, previous))
+    if 'gate' in settings:
+        #False: no gate, 'tuned': the gate the service would use, otherwise the gate itself
+        tier = simplifier.current_tier
+        if settings['gate'] is False:
+            gate = NO_GATE
+        elif settings['gate'] == 'tuned':
+            gate = load_tuning()["difficulty_gates"].get(tier, NO_GATE)
+        else:
+            gate = settings['gate']
+        previous_gate = dict(simplifier.difficulty_gates.get(tier, {}))
+        simplifier.set_difficulty_gate(tier, gate['min_score'], gate['top_fraction'])
+        undo.append(lambda: simplifier.set_difficulty_gate(tier, previous_gate.get('min_score'), previous_gate.get('top_fraction')))
+    if settings.get('fast'):
+        simplifier.fast_mode = True
+        undo.append(lambda: setattr(simplifier, 'fast_mode', False))
+    if settings.get('lexicon_only'):
+        simplifier.lexicon_only = True
+        undo.append(lambda: setattr(simplifier, 'lexicon_only', False))
+    if settings.get('quantized'):
+        import torch
+        full_model = simplifier.fill_mask.model
+        #a quantized copy, the full precision model is put back afterwards
+        simplifier.fill_mask.model = torch.ao.quantization.quantize_dynamic(full_model, {torch.nn.Linear}, dtype=torch.qint8)
+        undo.append(lambda: setattr(simplifier.fill_mask, 'model', full_model))
+
+    def restore():
+        for step in reversed(undo):
+            step()
+    return restore
+
+
+#this function runs one configuration over the held-out pairs
+def run_configuration(simplifier, name, settings, pairs):
+    restore = apply_configuration(simplifier, settings)
+    latencies = []
+    matched = proposed = expected = 0 #substitutions (word and replacement)
+    targets_matched = targets_proposed = targets_expected = 0 #only which words were changed
+    totals = {"model_calls": 0, "replacements": 0, "flesch_reading_ease_diff": 0.0,
+              "difficult_word_percent_diff": 0.0, "avg_word_length_diff": 0.0}
+    try:
+        for adv_sent, reference in pairs:
+            start = time.perf_counter()
+            output = simplifier.simplify_text(adv_sent)
+            latencies.append((time.perf_counter() - start) * 1000)
+            totals["model_calls"] += simplifier.request_stats["model_calls"]
+            totals["replacements"] += simplifier.replacement_count
+
+            system_subs = substitutions(adv_sent, output, simplifier.function_words)
+            reference_subs = substitutions(adv_sent, reference, simplifier.function_words)
+            matched += len(system_subs & reference_subs)
+            proposed += len(system_subs)
+            expected += len(reference_subs)
+            system_targets = {src for src, _ in system_subs}
+            reference_targets = {src for src, _ in reference_subs}
+            targets_matched += len(system_targets & reference_targets)
+            targets_proposed += len(system_targets)
+            targets_expected += len(reference_targets)
+
+            evaluation = simplifier.evaluate_simplification(adv_sent, output)
+            for key in ("flesch_reading_ease_diff", "difficult_word_percent_diff", "avg_word_length_diff"):
+                totals[key] += evaluation[key]
+    finally:
+        restore()
+
+    count = max(len(pairs), 1)
+    precision = matched / proposed if proposed else 0.0
+    recall = matched / expected if expected else 0.0
+    latencies.sort()
+    return {
+        "configuration": name,
+        "settings": settings,
+        "pairs": len(pairs),
+        "precision": round(precision, 4),
+        "recall": round(recall, 4),
+        "f1": round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0,
+        "target_precision": round(targets_matched / targets_proposed, 4) if targets_proposed else 0.0,
+        "target_recall": round(targets_matched / targets_expected, 4) if targets_expected else 0.0,
+        "mean_ms": round(sum(latencies) / count, 2),
+        "p50_ms": round(percentile(latencies, 50), 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95), 2) if latencies else None,
+        "model_calls": round(totals["model_calls"] / count, 2),
+        "replacements": round(totals["replacements"] / count, 2),
+        "flesch_reading_ease_diff": round(totals["flesch_reading_ease_diff"] / count, 2),
+        "difficult_word_percent_diff": round(totals["difficult_word_percent_diff"] / count, 2),
+        "avg_word_length_diff": round(totals["avg_word_length_diff"] / count, 3)
+    }
+
+
+#this function picks the gate with the fewest model calls whose F1 is at most max_f1_loss below the ungated F1
+#(None if no gate is good enough)
+def pick_gate(ungated, gated_results, max_f1_loss):
+    good = [result for result in gated_results if result["f1"] >= ungated["f1"] - max_f1_loss]
+    return min(good, key=lambda result: (result["model_calls"], -result["f1"])) if good else None
+
+
+#this function marks the results no other result beats on both mean latency and F1
+def mark_pareto(results):
+    for result in results:
+        result["pareto"] = not any(
+            other is not result and other["mean_ms"] <= result["mean_ms"] and other["f1"] >= result["f1"]
+            and (other["mean_ms"] < result["mean_ms"] or other["f1"] > result["f1"])
+            for other in results)
+    return results
+
+
+#this function prints the results sorted by latency (* marks the Pareto front)
+def print_table(results):
+    print(f"{'':1} {'configuration':<14} {'mean ms':>9} {'p95 ms':>9} {'calls':>7} {'prec':>6} {'recall':>6} {'f1':>6} "
+          f"{'tgt prec':>8} {'tgt rec':>7} {'FRE +':>7} {'hard% -':>7}")
+    for r in sorted(results, key=lambda r: r["mean_ms"]):
+        print(f"{'*' if r['pareto'] else '':1} {r['configuration']:<14} {r['mean_ms']:>9} {str(r['p95_ms']):>9} {r['model_calls']:>7} "
+              f"{r['precision']:>6.3f} {r['recall']:>6.3f} {r['f1']:>6.3f} {r['target_precision']:>8.3f} {r['target_recall']:>7.3f} "
+              f"{r['flesch_reading_ease_diff']:>7.2f} {r['difficult_word_percent_diff']:>7.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate simplifier configurations against the corpus references")
+    parser.add_argument('--tier', choices=sorted(TIER_FILES), default='beginner', help="which corpus (and tier settings) to use")
+    parser.add_argument('--configs', default=','.join(CONFIGURATIONS), help=f"comma separated, from {', '.join(CONFIGURATIONS)}")
+    parser.add_argument('--holdout-every', type=int, default=20, help="hold out every k-th pair")
+    parser.add_argument('--limit', type=int, default=200, help="held-out pairs to evaluate")
+    parser.add_argument('--stub', action='store_true', help="use the deterministic stub model (checks the harness, not quality)")
+    parser.add_argument('--report', default='evaluation_report.json', help="where to write the JSON report")
+    parser.add_argument('--tune-gates', action='store_true', help="try the gate grid and write the best gate to tuning.json")
+    parser.add_argument('--max-f1-loss', type=float, default=0.005, help="F1 a tuned gate may lose against no gate")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.configs.split(',') if name.strip()]
+    unknown = [name for name in names if name not in CONFIGURATIONS]
+    if unknown:
+        parser.error(f"unknown configurations: {', '.join(unknown)}")
+    file_tier, file_name = TIER_FILES[args.tier]
+    train, held_out = split_pairs(os.path.join(DATA_PATH, file_name), args.holdout_every)
+    held_out = held_out[:args.limit]
+    if not held_out:
+        parser.error(f"no held-out pairs in {file_name}")
+
+    from simplifier import NLPSimplifier
+    simplifier = NLPSimplifier(stub_model=args.stub)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        #the word map of the training pairs only (the held-out references must not leak into the lexicon)
+        train_path = os.path.join(tmp_dir, file_name)
+        write_pairs(train, train_path)
+        simplifier.word_map = simplifier.load_word_map(train_path)
+        simplifier.reference_index = simplifier.load_reference_index(train_path)
+    simplifier.current_tier = file_tier
+
+    results = []
+    for name in names:
+        settings = CONFIGURATIONS[name]
+        if settings.get('quantized') and getattr(simplifier.fill_mask, 'model', None) is None:
+            print(f"skipping {name}: the stub model can't be quantized", file=sys.stderr)
+            continue
+        if settings.get('fast') and simplifier.synonym_index is None:
+            print(f"skipping {name}: the synonym index wasn't built (python synonym_index.py)", file=sys.stderr)
+            continue
+        print(f"running {name} on {len(held_out)} pairs...", file=sys.stderr)
+        results.append(run_configuration(simplifier, name, settings, held_out))
+
+    chosen_gate = None
+    if args.tune_gates:
+        ungated = next((result for result in results if result["configuration"] == 'ungated'), None)
+        if ungated is None:
+            print(f"running ungated on {len(held_out)} pairs...", file=sys.stderr)
+            ungated = run_configuration(simplifier, 'ungated', CONFIGURATIONS['ungated'], held_out)
+            results.append(ungated)
+        gated_results = []
+        for min_score in GATE_MIN_SCORES:
+            for top_fraction in GATE_TOP_FRACTIONS:
+                name = f"gate>={min_score:g}" + (f",top{top_fraction:g}" if top_fraction is not None else "")
+                print(f"running {name} on {len(held_out)} pairs...", file=sys.stderr)
+                gate = {"min_score": min_score, "top_fraction": top_fraction}
+                gated_results.append(run_configuration(simplifier, name, {'gate': gate}, held_out))
+        results.extend(gated_results)
+        best = pick_gate(ungated, gated_results, args.max_f1_loss)
+        chosen_gate = best["settings"]["gate"] if best else dict(NO_GATE)
+    mark_pareto(results)
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "machine": {"cpu_count": os.cpu_count(), "platform": platform.platform(), "python": platform.python_version()},
+        "tier": args.tier,
+        "stub_model": args.stub,
+        "training_pairs": len(train),
+        "held_out_pairs": len(held_out),
+        "results": results
+    }
+    if args.tune_gates:
+        report["difficulty_gate"] = chosen_gate
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print_table(results)
+    print(f"\nreport written to {args.report}")
+    if args.tune_gates:
+        print(f"difficulty gate for {args.tier}: min_score={chosen_gate['min_score']} top_fraction={chosen_gate['top_fraction']}")
+        if args.stub:
+            #the stub's replacements say nothing about quality, so its gate isn't used by the service
+            print("not written to the tuning file (stub model)", file=sys.stderr)
+        else:
+            gates = read_tuning_file().get("difficulty_gates", {})
+            gates[file_tier] = chosen_gate
+            save_tuning({"difficulty_gates": gates})
+            print("written to the tuning file")
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+#gunicorn settings from tuning.json (see tuning.py and autotune.py)
+#gunicorn reads this file from the working directory, command line flags still override it
+import gc
+import os
+from tuning import load_tuning
+
+tuning = load_tuning()
+workers = tuning["workers"]
+#a worker simplifies one request at a time; the other threads hold the requests waiting in its admission queue
+#(SIMPLIFIER_MAX_QUEUE, see admission.py) plus one more, so a request over the limit gets a quick 503 instead of
+#waiting unseen in the listen backlog
+threads = max(tuning["threads"], int(os.environ.get('SIMPLIFIER_MAX_QUEUE', 16)) + 2)
+
+#SIMPLIFIER_PRELOAD=1 loads the app (model, spaCy, WordNet, lexicons) once in the master and forks the workers from
+#it, so they share its pages instead of each loading a copy; with SIMPLIFIER_SHARED_WEIGHTS=1 the model weights and
+#lexicons are also memory-mapped from shared files (see shared_state.py), which keeps them shared even where a worker
+#writes to the objects around them. both are off by default, each worker loads its own copy
+preload_app = os.environ.get('SIMPLIFIER_PRELOAD', '0').lower() in ('1', 'true', 'yes')
+if preload_app:
+    #tells app.py that it is loaded in the master (which mustn't run the model before the workers are forked)
+    os.environ['SIMPLIFIER_PRELOADED'] = '1'
+
+
+#moving everything the app allocated at boot out of the garbage collector's generations: a collection in a worker
+#would otherwise write to every object's header and copy the pages it shares with the master
+def pre_fork(server, worker):
+    gc.freeze()
+
+
+#torch's thread pool is sized from the worker count gunicorn actually runs with (which a --workers flag may have
+#changed); with preload_app the app was loaded before the fork and is told in after_fork
+def post_fork(server, worker):
+    os.environ['WEB_CONCURRENCY'] = str(server.cfg.workers)
+    if server.cfg.preload_app:
+        import app
+        app.after_fork()
@@ -0,0 +1,167 @@
+#compact, read-mostly versions of the simplifier's lexicons for the low-memory serving profile
+#a python dict of str uses ~100+ bytes per entry, a marisa-trie stores the same keys in a few bytes each
+#the classes support the same operations the simplifier uses on its dicts/sets so they can be swapped in
+#saved to a file they can also be memory-mapped (load), so the worker processes of a node share one copy of the pages
+#(see shared_state.py)
+import sys
+import marisa_trie
+import numpy as np
+
+
+#set of words (semantic keywords)
+class CompactSet:
+    def __init__(self, words):
+        self.trie = marisa_trie.Trie(words)
+        self.mapped = False #memory-mapped from a file (its pages don't count as memory of this process)
+
+    def __contains__(self, word):
+        return word in self.trie
+
+    def __iter__(self):
+        return iter(self.trie)
+
+    def __len__(self):
+        return len(self.trie)
+
+    def nbytes(self):
+        return 0 if self.mapped else len(self.trie.tobytes())
+
+    #the files save writes, the trie last (its presence means the lexicon is complete)
+    @staticmethod
+    def paths(path):
+        return [path]
+
+    def save(self, path):
+        self.trie.save(path)
+
+    #this function memory-maps a lexicon written by save
+    @classmethod
+    def load(cls, path):
+        compact = cls.__new__(cls)
+        compact.trie = marisa_trie.Trie()
+        compact.trie.mmap(path)
+        compact.mapped = True
+        return compact
+
+
+#word -> word map (word map, antonyms)
+#words added after it was built (find_antonym caches new antonyms) go into a small overflow dict
+class CompactStringMap:
+    def __init__(self, mapping):
+        self.trie = marisa_trie.BytesTrie((key, value.encode('utf-8')) for key, value in mapping.items())
+        self.overflow = {}
+        self.mapped = False
+
+    def get(self, key, default=None):
+        if key in self.overflow:
+            return self.overflow[key]
+        values = self.trie.get(key)
+        return values[0].decode('utf-8') if values else default
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.overflow[key] = value
+
+    def __contains__(self, key):
+        return key in self.overflow or key in self.trie
+
+    def __iter__(self):
+        yield from self.trie.keys()
+        yield from (key for key in self.overflow if key not in self.trie)
+
+    def __len__(self):
+        return len(self.trie) + sum(1 for key in self.overflow if key not in self.trie)
+
+    def __bool__(self):
+        return len(self.trie) > 0 or bool(self.overflow)
+
+    def items(self):
+        return ((key, self[key]) for key in self)
+
+    def nbytes(self):
+        return (0 if self.mapped else len(self.trie.tobytes())) + deep_sizeof(self.overflow)
+
+    @staticmethod
+    def paths(path):
+        return [path]
+
+    #only the trie is saved, words in the overflow dict stay private to this process
+    def save(self, path):
+        self.trie.save(path)
+
+    @classmethod
+    def load(cls, path):
+        compact = cls.__new__(cls)
+        compact.trie = marisa_trie.BytesTrie()
+        compact.trie.mmap(path)
+        compact.overflow = {}
+        compact.mapped = True
+        return compact
+
+
+#word -> frequency map (SUBTLEX)
+#the trie gives every word an id and the frequencies are stored in a float32 array at that id
+class CompactFloatMap:
+    def __init__(self, mapping):
+        self.trie = marisa_trie.Trie(mapping.keys())
+        self.values = np.zeros(len(self.trie), dtype=np.float32)
+        for key, value in mapping.items():
+            self.values[self.trie[key]] = value
+        self.mapped = False
+
+    def get(self, key, default=None):
+        idx = self.trie.get(key)
+        return float(self.values[idx]) if idx is not None else default
+
+    def __getitem__(self, key):
+        return float(self.values[self.trie[key]])
+
+    def __contains__(self, key):
+        return key in self.trie
+
+    def __iter__(self):
+        return iter(self.trie)
+
+    def __len__(self):
+        return len(self.trie)
+
+    def items(self):
+        return ((key, float(self.values[idx])) for key, idx in self.trie.items())
+
+    def nbytes(self):
+        return 0 if self.mapped else len(self.trie.tobytes()) + self.values.nbytes
+
+    #the frequencies go into a .npy file next to the trie
+    @staticmethod
+    def paths(path):
+        return [path + '.npy', path]
+
+    def save(self, path):
+        np.save(path + '.npy', self.values)
+        self.trie.save(path)
+
+    @classmethod
+    def load(cls, path):
+        compact = cls.__new__(cls)
+        compact.trie = marisa_trie.Trie()
+        compact.trie.mmap(path)
+        compact.values = np.load(path + '.npy', mmap_mode='r')
+        compact.mapped = True
+        return compact
+
+
+#this function estimates how many bytes a lexicon takes (compact lexicons know their own size)
+def deep_sizeof(obj):
+    if hasattr(obj, 'nbytes') and callable(obj.nbytes):
+        return obj.nbytes()
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(sys.getsizeof(key) + sys.getsizeof(value) for key, value in obj.items())
+    elif isinstance(obj, (set, frozenset, list, tuple)):
+        size += sum(sys.getsizeof(item) for item in obj)
+    return size
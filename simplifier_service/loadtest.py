@@ -0,0 +1,259 @@
+#local load test for the simplifier service
+#it replays passages from data/ADV-*.txt and data/comprehension-texts against /simplify, /set-tier and /health
+#with N parallel clients and reports throughput, p50/p95/p99 latency and error rate per route
+#it can start the service itself under gunicorn for each worker/thread configuration, optionally with the
+#stub model (SIMPLIFIER_STUB_MODEL=1) so it runs offline and only measures the service's own overhead
+#
+#e.g. python loadtest.py --stub --workers 1,2,4 --threads 1,4 --clients 8,32 --duration 30
+#     python loadtest.py --url http://localhost:5000 --clients 16
+import os
+import sys
+import json
+import math
+import time
+import random
+import socket
+import argparse
+import platform
+import threading
+import subprocess
+import urllib.request
+import urllib.error
+from datetime import datetime, timezone
+from word_map_builder import iter_corpus_pairs
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(BASE_PATH, 'data')
+TIERS = ['beginner', 'intermediate']
+
+
+#this function loads realistic request payloads: the advanced sentences of the corpus pairs
+#(what the daily exercise sends) and the advanced paragraphs of the comprehension texts
+#(the payloads repeat and the corpus sentences are in the reference index, so the service started here runs without
+#the result cache, the warm-up and the reference index to measure the pipeline rather than the lookups)
+def load_payloads(min_words=10, limit=None):
+    payloads = []
+    for file_name in ('ADV-ELE.txt', 'ADV-INT.txt'):
+        file_path = os.path.join(DATA_PATH, file_name)
+        if os.path.exists(file_path):
+            for adv_sent, _, _ in iter_corpus_pairs(file_path):
+                if len(adv_sent.split()) >= min_words:
+                    payloads.append(adv_sent)
+    texts_dir = os.path.join(DATA_PATH, 'comprehension-texts')
+    if os.path.isdir(texts_dir):
+        for file_name in sorted(os.listdir(texts_dir)):
+            with open(os.path.join(texts_dir, file_name), 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.startswith('Adv:'):
+                        payloads.append(line[len('Adv:'):].strip())
+    if limit:
+        payloads = payloads[:limit]
+    return payloads
+
+
+#this function gets the nearest-rank percentile of a sorted list
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+#this function summarizes a list of (latency in seconds, ok) results
+def summarize(results, duration):
+    latencies = sorted(latency * 1000 for latency, _ in results)
+    errors = sum(1 for _, ok in results if not ok)
+    return {
+        "requests": len(results),
+        "throughput_rps": round(len(results) / duration, 2) if duration else 0,
+        "p50_ms": round(percentile(latencies, 50), 1) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95), 1) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99), 1) if latencies else None,
+        "error_rate": round(errors / len(results), 4) if results else 0
+    }
+
+
+#this function sends one request and returns (latency in seconds, ok)
+def send(base_url, route, body, timeout):
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    req = urllib.request.Request(base_url + route, data=data, method='POST' if body is not None else 'GET',
+                                 headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            ok = 200 <= resp.status < 300
+    except (urllib.error.URLError, socket.timeout, ConnectionError):
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+#this function runs the clients against a running service for `duration` seconds
+#mix is the share of requests per route, e.g. {'/simplify': 0.9, '/set-tier': 0.05, '/health': 0.05}
+def run_load(base_url, payloads, clients, duration, mix, timeout=60.0, seed=0):
+    routes = list(mix)
+    weights = [mix[route] for route in routes]
+    results = {route: [] for route in routes}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client(client_id):
+        rng = random.Random(seed + client_id)
+        while time.monotonic() < stop_at:
+            route = rng.choices(routes, weights)[0]
+            if route == '/simplify':
+                body = {"text": rng.choice(payloads)}
+            elif route == '/set-tier':
+                body = {"tier": rng.choice(TIERS)}
+            else:
+                body = None
+            result = send(base_url, route, body, timeout)
+            with lock:
+                results[route].append(result)
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(clients)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+    report = {route: summarize(route_results, elapsed) for route, route_results in results.items()}
+    report["all"] = summarize([r for route_results in results.values() for r in route_results], elapsed)
+    return report
+
+
+#this function finds a free local port
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+#this function waits until the service answers /health (loading the models can take a while)
+def wait_until_ready(base_url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + '/health', timeout=5) as resp:
+                if json.loads(resp.read()).get("simplifier_initialized"):
+                    return True
+        except (urllib.error.URLError, socket.timeout, ConnectionError, ValueError):
+            pass
+        time.sleep(1)
+    return False
+
+
+#this function starts the service under gunicorn with the given number of workers and threads
+def start_service(workers, threads, stub, port, extra_env=None):
+    env = dict(os.environ)
+    env['SIMPLIFIER_STUB_MODEL'] = '1' if stub else env.get('SIMPLIFIER_STUB_MODEL', '0')
+    env.update(extra_env or {})
+    cmd = [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', str(threads),
+           '--bind', f'127.0.0.1:{port}', '--timeout', '300', 'app:app']
+    return subprocess.Popen(cmd, cwd=BASE_PATH, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+#this function stops a service started by start_service
+def stop_service(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+#this function parses a comma separated list of ints ("1,2,4")
+def int_list(value):
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+#this function prints one line per configuration (and the change against a baseline report if given)
+def print_table(runs, baseline=None):
+    baseline_runs = {}
+    for run in (baseline or {}).get("runs", []):
+        baseline_runs[(run["workers"], run["threads"], run["clients"])] = run["routes"]["all"]
+    print(f"{'workers':>7} {'threads':>7} {'clients':>7} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for run in runs:
+        stats = run["routes"]["all"]
+        line = (f"{str(run['workers']):>7} {str(run['threads']):>7} {run['clients']:>7} {stats['throughput_rps']:>9} "
+                f"{str(stats['p50_ms']):>9} {str(stats['p95_ms']):>9} {str(stats['p99_ms']):>9} {stats['error_rate']:>7.2%}")
+        old = baseline_runs.get((run["workers"], run["threads"], run["clients"]))
+        if old and old["throughput_rps"] and old["p99_ms"] and stats["p99_ms"]:
+            line += (f"   vs baseline: rps {stats['throughput_rps'] / old['throughput_rps'] - 1:+.1%},"
+                     f" p99 {stats['p99_ms'] / old['p99_ms'] - 1:+.1%}")
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the simplifier service")
+    parser.add_argument('--url', help="test an already running service instead of starting gunicorn")
+    parser.add_argument('--workers', type=int_list, default=[1], help="gunicorn worker counts to try (e.g. 1,2,4)")
+    parser.add_argument('--threads', type=int_list, default=[1], help="gunicorn thread counts to try (e.g. 1,4)")
+    parser.add_argument('--clients', type=int_list, default=[8], help="parallel client counts to try (e.g. 1,8,32)")
+    parser.add_argument('--duration', type=float, default=30, help="seconds per configuration")
+    parser.add_argument('--warmup', type=float, default=5, help="seconds of unmeasured traffic before each run")
+    parser.add_argument('--stub', action='store_true', help="start the service with the deterministic stub model")
+    parser.add_argument('--simplify-share', type=float, default=0.9, help="share of /simplify requests (rest is split between /set-tier and /health)")
+    parser.add_argument('--timeout', type=float, default=60, help="client timeout in seconds")
+    parser.add_argument('--boot-timeout', type=float, default=600, help="seconds to wait for the service to load")
+    parser.add_argument('--limit', type=int, default=None, help="only use the first N payloads")
+    parser.add_argument('--report', default='loadtest_report.json', help="where to write the JSON report")
+    parser.add_argument('--baseline', help="earlier report to compare against")
+    args = parser.parse_args(argv)
+
+    payloads = load_payloads(limit=args.limit)
+    if not payloads:
+        parser.error(f"no payloads found in {DATA_PATH}")
+    rest = (1 - args.simplify_share) / 2
+    mix = {'/simplify': args.simplify_share, '/set-tier': rest, '/health': rest}
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    #with --url there is only one (unknown) server configuration
+    server_configs = [(None, None)] if args.url else [(w, t) for w in args.workers for t in args.threads]
+    runs = []
+    for workers, threads in server_configs:
+        process = None
+        base_url = args.url.rstrip('/') if args.url else None
+        if not args.url:
+            port = free_port()
+            base_url = f'http://127.0.0.1:{port}'
+            process = start_service(workers, threads, args.stub, port, {'SIMPLIFIER_RESULT_CACHE_SIZE': '0',
+                                                                        'SIMPLIFIER_WARM_WINDOW': '0',
+                                                                        'SIMPLIFIER_REFERENCES': '0'})
+        try:
+            if not wait_until_ready(base_url, args.boot_timeout):
+                print(f"service at {base_url} did not become ready (workers={workers}, threads={threads})", file=sys.stderr)
+                continue
+            for clients in args.clients:
+                if args.warmup:
+                    run_load(base_url, payloads, clients, args.warmup, mix, args.timeout)
+                routes = run_load(base_url, payloads, clients, args.duration, mix, args.timeout)
+                runs.append({"workers": workers, "threads": threads, "clients": clients, "routes": routes})
+                print_table(runs[-1:], baseline)
+        finally:
+            if process:
+                stop_service(process)
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "machine": {"cpu_count": os.cpu_count(), "platform": platform.platform(), "python": platform.python_version()},
+        "stub_model": args.stub,
+        "duration_s": args.duration,
+        "mix": mix,
+        "payloads": len(payloads),
+        "runs": runs
+    }
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print()
+    print_table(runs, baseline)
+    print(f"\nreport written to {args.report}")
+    return report
+
+
+if __name__ == '__main__':
+    main()
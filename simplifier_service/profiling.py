@@ -0,0 +1,117 @@
+#per-request profiling of the simplifier (/simplify?profile=1 or the X-Profile: 1 header)
+#while a RequestProfiler is active the simplifier's expensive steps are wrapped with timers on the instance and every
+#word gets a decision record (replaced/kept/skipped, why, how many model predictions were examined, model time)
+#nothing is wrapped outside of a profiled request, so the only cost when profiling is off is the
+#start_decision/note_decision calls returning right away
+#
+#the stage times are inclusive (e.g. get_contextual_replacement includes its get_pos_info and predict_masked calls)
+import io
+import time
+import pstats
+import cProfile
+
+#simplifier methods that are timed (stage name -> what it covers)
+STAGES = {
+    'plan_sentence': "tokenizing a sentence and picking the candidate words",
+    'spacy_nlp': "spaCy parses (including the re-parses in get_pos_info)",
+    'get_pos_info': "part of speech lookups",
+    'get_lexicon_replacement': "word map lookups",
+    'gate_candidates': "difficulty gate",
+    'get_contextual_replacement': "contextual (model) replacement of a word",
+    'predict_masked': "fill-mask model calls",
+    'prefetch_predictions': "batched fill-mask model calls (inference_batch_size > 1)",
+    'is_semantic_keyword': "WordNet semantic keyword checks",
+    'find_antonym': "WordNet antonym lookups",
+    'is_better_for_dyslexia': "candidate comparisons",
+    'force_additional_replacements': "forced pass for the minimum replacement percentage",
+    'get_forced_replacement': "forced replacement of a word",
+}
+MODEL_STAGE = 'predict_masked'
+
+
+class RequestProfiler:
+    #use_cprofile also runs cProfile and attaches the top_functions functions by cumulative time
+    def __init__(self, simplifier, use_cprofile=False, top_functions=25):
+        self.simplifier = simplifier
+        self.use_cprofile = use_cprofile
+        self.top_functions = top_functions
+        self.stages = {}
+        self.originals = {}
+        self.decisions = []
+        self.cprofile = None
+        self.start = None
+        self.total_ms = 0.0
+
+    def __enter__(self):
+        for name in STAGES:
+            func = getattr(self.simplifier, name, None)
+            if func is None:
+                continue
+            #spacy_nlp is already an instance attribute, the methods are shadowed by one
+            self.originals[name] = self.simplifier.__dict__.get(name)
+            setattr(self.simplifier, name, self.timed(name, func))
+        self.simplifier.decision_trace = []
+        self.simplifier.current_decision = None
+        if self.use_cprofile:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.total_ms = (time.perf_counter() - self.start) * 1000
+        if self.cprofile:
+            self.cprofile.disable()
+        for name, original in self.originals.items():
+            if original is None:
+                del self.simplifier.__dict__[name]
+            else:
+                setattr(self.simplifier, name, original)
+        self.decisions = self.simplifier.decision_trace
+        self.simplifier.decision_trace = None
+        self.simplifier.current_decision = None
+        return False
+
+    #this function wraps a simplifier step so its calls and time are counted
+    #(model time is also added to the decision record of the word being decided)
+    def timed(self, name, func):
+        stats = self.stages.setdefault(name, {"calls": 0, "total_ms": 0.0})
+        simplifier = self.simplifier
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = (time.perf_counter() - start) * 1000
+                stats["calls"] += 1
+                stats["total_ms"] += elapsed
+                if name == MODEL_STAGE and simplifier.current_decision is not None:
+                    simplifier.current_decision["model_ms"] += elapsed
+        return wrapper
+
+    #this function summarizes the cProfile run (the functions with the most cumulative time)
+    def cprofile_summary(self):
+        stats = pstats.Stats(self.cprofile, stream=io.StringIO())
+        rows = []
+        for (file_name, line, function), (_, calls, total, cumulative, _) in stats.stats.items():
+            rows.append({
+                "function": f"{file_name}:{line}({function})",
+                "calls": calls,
+                "total_ms": round(total * 1000, 2),
+                "cumulative_ms": round(cumulative * 1000, 2)
+            })
+        rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+        return rows[:self.top_functions]
+
+    #this function returns the profile of the request (call after the with block)
+    def report(self):
+        report = {
+            "total_ms": round(self.total_ms, 2),
+            "stages": {name: {"calls": stats["calls"], "total_ms": round(stats["total_ms"], 2), "description": STAGES[name]}
+                       for name, stats in self.stages.items() if stats["calls"]},
+            "decisions": [dict(record, model_ms=round(record["model_ms"], 2)) for record in self.decisions]
+        }
+        if self.cprofile:
+            report["cprofile"] = self.cprofile_summary()
+        return report
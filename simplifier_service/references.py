@@ -0,0 +1,83 @@
+#exact-match lookup of the human simplifications in the aligned corpora (ADV-ELE/ADV-INT)
+#the daily exercises send the advanced line of a corpus pair to /simplify, and the simplified line of the same pair is a
+#human simplification of exactly that text. the index maps each normalized advanced line (and, when both lines split
+#into the same number of sentences, each of its sentences) to its simplified counterpart, so those inputs are answered
+#with a dict lookup instead of the model
+import re
+from nltk.tokenize import sent_tokenize
+try:
+    from .word_map_builder import iter_corpus_pairs
+except ImportError:
+    from word_map_builder import iter_corpus_pairs
+
+MAX_SPAN = 4 #most consecutive input sentences that are looked up together as one corpus line
+MIN_WORDS = 4 #shorter sentences ("Yes, he did.") are too generic to stand for one particular pair
+WORD = re.compile(r"\w+(?:'\w+)*")
+
+
+#this function normalizes a sentence for the lookup (lowercase words only, so spacing, quotes and
+#punctuation differences still match)
+def normalize_sentence(text):
+    return ' '.join(WORD.findall(text.lower()))
+
+
+#normalized advanced sentence -> reference simplification
+class ReferenceIndex:
+    def __init__(self, references=None, max_span=1):
+        self.references = references if references is not None else {}
+        self.max_span = max_span #most sentences an indexed line has (longer spans can't match)
+
+    #this function looks up a sentence (or several sentences joined) and returns the reference or None
+    def get(self, text):
+        key = normalize_sentence(text)
+        if len(key.split()) < MIN_WORDS:
+            return None
+        return self.references.get(key)
+
+    #this function groups consecutive sentences that together are one indexed corpus line
+    #(longest match first) and leaves the other sentences as they are
+    def group_sentences(self, sentences):
+        if self.max_span <= 1 or not self.references:
+            return list(sentences)
+        grouped = []
+        idx = 0
+        while idx < len(sentences):
+            for span in range(min(self.max_span, len(sentences) - idx), 1, -1):
+                joined = ' '.join(sentences[idx:idx + span])
+                if self.get(joined) is not None:
+                    grouped.append(joined)
+                    idx += span
+                    break
+            else:
+                grouped.append(sentences[idx])
+                idx += 1
+        return grouped
+
+    def __len__(self):
+        return len(self.references)
+
+    def __bool__(self):
+        return len(self.references) > 0
+
+
+#this function builds the reference index of a corpus file
+#the first pair wins when the same advanced sentence appears more than once
+def build_reference_index(file_path):
+    references = {}
+    max_span = 1
+    for adv_sent, ref_sent, _ in iter_corpus_pairs(file_path):
+        key = normalize_sentence(adv_sent)
+        if len(key.split()) < MIN_WORDS:
+            continue
+        references.setdefault(key, ref_sent)
+        adv_sentences = sent_tokenize(adv_sent)
+        ref_sentences = sent_tokenize(ref_sent)
+        if len(adv_sentences) > 1:
+            max_span = max(max_span, min(len(adv_sentences), MAX_SPAN))
+            #the sentences line up one to one, so each of them can be looked up on its own too
+            if len(adv_sentences) == len(ref_sentences):
+                for adv_part, ref_part in zip(adv_sentences, ref_sentences):
+                    part_key = normalize_sentence(adv_part)
+                    if len(part_key.split()) >= MIN_WORDS:
+                        references.setdefault(part_key, ref_part)
+    return ReferenceIndex(references, max_span)
@@ -0,0 +1,97 @@
+#cache of finished simplifications (filled by live requests and by the background warm-up in warmup.py)
+#an entry has the simplified text and the request state the response is built from
+#(replacement count, skipped words, request stats and the replacement reasons for the edit list)
+#results depend on the difficulty profile of the requesting user where the tier's difficulty gate filters words (the
+#profile raises the difficulty scores of its words), so then the profile is part of the key; entries made with
+#simplify_text_with_records also keep the sentence records and the profile they were made with, so a text cached for
+#one profile (e.g. the warm-up's, which has none) is brought to another by re-simplifying only the sentences the
+#differing words can affect
+import threading
+from collections import OrderedDict
+
+
+#this function builds the cache key of a request
+#(fast mode results come from the synonym index, so they are kept apart from the model's; profile is the set of
+#words the user marked as difficult)
+def result_key(tier, text, document=False, fast=False, profile=frozenset()):
+    return (tier, bool(document), bool(fast), frozenset(profile), text)
+
+
+#this function gets the profile a result of the simplifier's current state depends on (none without a difficulty gate)
+def result_profile(simplifier):
+    return frozenset(simplifier.user_difficulty_profile) if simplifier.gate_active() else frozenset()
+
+
+#this function copies what a response needs from the simplifier after a simplify_text/simplify_document call
+#(records are the sentence records from simplify_text_with_records, if there are any)
+def snapshot_result(simplifier, simplified_text, records=None):
+    return {
+        "simplified_text": simplified_text,
+        "replacement_count": getattr(simplifier, 'replacement_count', 0),
+        "skipped_words": list(getattr(simplifier, 'skipped_words', [])),
+        "request_stats": dict(simplifier.request_stats),
+        "replacement_reasons": dict(getattr(simplifier, 'replacement_reasons', {})),
+        "records": records,
+        "profile": result_profile(simplifier)
+    }
+
+
+#this function brings a cached result made with another profile to the simplifier's current profile (the caller holds
+#the lock and has loaded the requesting user's profile)
+#it returns the result (re-simplifying only the affected sentences) or None if it has to be simplified from scratch
+def refresh_result(simplifier, result):
+    profile = result_profile(simplifier)
+    if result["profile"] == profile:
+        return result
+    if not result.get("records"):
+        return None
+    changed = result["profile"] ^ profile
+    influence = set().union(*(record["influence"] for record in result["records"]))
+    if not changed & influence:
+        #none of the differing words are in the text
+        return dict(result, profile=profile)
+    simplified_text, records, redone = simplifier.resimplify_text(result["records"], changed)
+    refreshed = snapshot_result(simplifier, simplified_text, records)
+    refreshed["resimplified_sentences"] = redone
+    return refreshed
+
+
+#least recently used cache with a maximum number of entries (safe to use from several threads)
+class ResultCache:
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            result = self.entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,131 @@
+#read-only simplifier state shared by the worker processes of a node (SIMPLIFIER_SHARED_WEIGHTS=1)
+#every gunicorn worker used to load its own copy of the model weights and lexicons, so each extra worker cost the
+#whole model again. here the heavy read-only parts are written once to SIMPLIFIER_SHARED_DIR and every process
+#memory-maps them:
+#  - the masked LM: its tensors saved with safetensors and loaded with safetensors' load_file, which maps the file,
+#    into a model built on the meta device (so no weights are allocated before they are replaced by the mapped ones);
+#    a safetensors file only holds tensors, so nothing in the shared directory is unpickled
+#  - the lexicons (semantic keywords, antonyms, word maps, frequencies): marisa-tries (and a numpy array) mapped
+#    from files, see lexicons.py
+#mapped pages are shared through the page cache, so an extra worker only costs its private heap
+#the files are written by the first process that needs them (atomically, so workers starting together are fine) and
+#named after what they were built from, so a changed corpus or library version makes new ones instead of stale reads
+import os
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+SHARED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'shared')
+
+
+#this function gets a short version of a source file (size and modification time) for the names of derived files
+def file_version(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+#this function gets a short hash of a lexicon's content for the names of its files
+def content_version(lexicon):
+    items = sorted(lexicon.items()) if isinstance(lexicon, dict) else sorted(lexicon)
+    return hashlib.sha1(repr(items).encode('utf-8')).hexdigest()[:12]
+
+
+#this function writes a file through a temporary name and renames it when it is complete
+#save(tmp_path) writes it; paths(path) lists the files written for a path (renamed in that order, so a lexicon's
+#trie, listed last, only appears when its other files are in place)
+def _write_atomically(path, save, paths=lambda path: [path]):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        save(tmp_path)
+        for written, final in zip(paths(tmp_path), paths(path)):
+            os.replace(written, final)
+    finally:
+        for written in paths(tmp_path):
+            if os.path.exists(written):
+                os.remove(written)
+
+
+#this function memory-maps a lexicon from the shared directory, building and saving it first if it isn't there
+#compact_class is one of the classes in lexicons.py and build() returns the dict/set it is made from
+def shared_lexicon(name, compact_class, build, shared_dir=SHARED_DIR):
+    path = os.path.join(shared_dir, f"{name}.trie")
+    if not os.path.exists(path):
+        lexicon = build()
+        if not lexicon:
+            #an empty lexicon is what a failed build returns (e.g. build_word_map logs the error and returns {}):
+            #it is only kept in memory, so the next start builds it again instead of mapping the empty file for good
+            logger.warning(f"Lexicon {name} is empty, not saving it to {shared_dir}")
+            return compact_class(lexicon)
+        os.makedirs(shared_dir, exist_ok=True)
+        compact = compact_class(lexicon)
+        _write_atomically(path, compact.save, compact_class.paths)
+        del compact, lexicon
+    return compact_class.load(path)
+
+
+#this function writes the tensors of a model to a safetensors file
+#a file can't hold the same tensor twice, so tied weights (e.g. the output embeddings) are written once and listed as
+#aliases, and the buffers that aren't in the state dict (e.g. position ids) are added so the model can be rebuilt
+def _save_model_tensors(model, path):
+    from safetensors.torch import save_file
+    state = model.state_dict()
+    buffers = [name for name, _ in model.named_buffers() if name not in state]
+    tensors = {}
+    aliases = {}
+    written = {}
+    for name, tensor in list(state.items()) + [(name, model.get_buffer(name)) for name in buffers]:
+        key = (tensor.data_ptr(), tuple(tensor.shape), tensor.dtype)
+        if key in written:
+            aliases[name] = written[key]
+            continue
+        written[key] = name
+        tensors[name] = tensor.detach().contiguous()
+    save_file(tensors, path, metadata={"aliases": json.dumps(aliases), "buffers": json.dumps(buffers)})
+
+
+#this function loads the masked LM with its weights memory-mapped from the shared directory (saving them there first)
+def shared_model(model_name, shared_dir=SHARED_DIR):
+    import torch
+    import transformers
+    from safetensors import safe_open
+    from safetensors.torch import load_file
+    from transformers import AutoConfig, AutoModelForMaskedLM
+    name = f"{model_name.replace('/', '_')}-transformers{transformers.__version__}.safetensors"
+    path = os.path.join(shared_dir, name)
+    if not os.path.exists(path):
+        os.makedirs(shared_dir, exist_ok=True)
+        model = AutoModelForMaskedLM.from_pretrained(model_name)
+        _write_atomically(path, lambda tmp_path: _save_model_tensors(model, tmp_path))
+        del model
+        logger.info(f"Saved {model_name} for sharing to {path}")
+    with safe_open(path, framework="pt") as f:
+        metadata = f.metadata()
+    tensors = load_file(path)
+    for alias, name in json.loads(metadata["aliases"]).items():
+        tensors[alias] = tensors[name]
+    with torch.device("meta"):
+        model = AutoModelForMaskedLM.from_config(AutoConfig.from_pretrained(model_name))
+    #the buffers that aren't in the state dict are set directly, load_state_dict skips them
+    for buffer_name in json.loads(metadata["buffers"]):
+        module_name, _, attribute = buffer_name.rpartition('.')
+        model.get_submodule(module_name).register_buffer(attribute, tensors.pop(buffer_name), persistent=False)
+    model.load_state_dict(tensors, assign=True)
+    model.tie_weights()
+    model.eval()
+    return model
+
+
+#this function estimates how many bytes of this process's memory are private (not shared with other processes)
+#from /proc/self/smaps_rollup (None where it isn't available)
+def process_private_bytes():
+    try:
+        private = 0
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                    private += int(line.split()[1]) * 1024
+        return private
+    except OSError:
+        return None
@@ -3,16 +3,37 @@ from nltk.tokenize import word_tokenize, sent_tokenize
 from nltk.corpus import wordnet as wn
 import re
 import difflib
-import pandas as pd
-from collections import defaultdict
 from textstat import flesch_reading_ease
 from transformers import pipeline, AutoTokenizer
 import spacy
 import os
 import logging
 import string
+import time
+#the service's own modules: relative imports when this file is imported as part of the simplifier_service package
+#(backend/api.py), plain ones when the service runs from its own directory (app.py, the command line tools)
+try:
+    from .word_map_builder import update_pair_counts
+    from .document import split_paragraphs, join_paragraphs, simplify_paragraphs, new_counters, merge_counters
+    from .references import ReferenceIndex, build_reference_index
+    from .synonym_index import load_synonym_index
+    from .shared_state import shared_lexicon, shared_model, file_version, content_version, process_private_bytes
+    from .lexicons import CompactSet, CompactStringMap, CompactFloatMap, deep_sizeof
+    from .stub_model import StubFillMask
+except ImportError:
+    from word_map_builder import update_pair_counts
+    from document import split_paragraphs, join_paragraphs, simplify_paragraphs, new_counters, merge_counters
+    from references import ReferenceIndex, build_reference_index
+    from synonym_index import load_synonym_index
+    from shared_state import shared_lexicon, shared_model, file_version, content_version, process_private_bytes
+    from lexicons import CompactSet, CompactStringMap, CompactFloatMap, deep_sizeof
+    from stub_model import StubFillMask
+import math
+import gc
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
+#folder with the ADV-ELE/ADV-INT corpus files
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
 try:
     nltk.data.find('tokenizers/punkt')
 except LookupError:
@@ -23,39 +44,103 @@ except LookupError:
     nltk.download('wordnet')
 
 
+#this function gets the resident memory of this process in bytes (peak memory if /proc isn't available)
+def process_rss_bytes():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+#this function adds up the bytes of all tensors of a model (quantized layers keep their weights in packed params)
+def model_nbytes(model):
+    def tensor_bytes(value):
+        if hasattr(value, 'element_size') and hasattr(value, 'numel'):
+            return value.element_size() * value.numel()
+        if isinstance(value, (tuple, list)):
+            return sum(tensor_bytes(item) for item in value)
+        return 0
+    return sum(tensor_bytes(value) for value in model.state_dict().values())
+
+
+#defining function words to not be simplified because if we replace them, we could drastically change the meaning of the sentence
+#citation: https://semanticsimilarity.wordpress.com/function-word-lists/ (the 277 word list)
+#i did delete some words because they were really difficult in the first place
+FUNCTION_WORDS = frozenset({
+    'a', 'about', 'above', 'across', 'after', 'afterwards', 'against', 'again', 'all', 'almost', 'alone', 'along', 'already', 'also',
+    'although', 'always', 'am', 'among', 'an', 'and', 'another', 'any', 'anyhow', 'anyone', 'anything', 'anyway',
+    'anywhere', 'are', 'around', 'as', 'at', 'be', 'became', 'because', 'been', 'before', 'behind', 'being', 'below', 'beside',
+    'besides', 'betwen', 'beyond', 'both', 'but', 'by', 'can', 'cannot', 'could', 'dare', 'despite', 'did', 'do', 'does', 'done', 'down', 'during',
+    'each', 'eg', 'either', 'else', 'elsewhere', 'enough', 'etc', 'even', 'ever', 'everyone', 'everything', 'everywhere', 'except', 'few', 'first',
+    'for', 'former', 'formerly', 'from', 'further', 'had', 'has', 'have', 'he', 'hence', 'her', 'here', 
+    'hereby', 'hers', 'herself', 'him', 'himself', 'his', 'how', 'however',
+    'i', 'ie', 'if', 'in', 'indeed', 'inside', 'instead', 'into', 'is', 'it', 'its', 'itself', 'last', 'least', 'less', 'lot', 'lots', 'many', 'may', 'me',
+    'meanwhile', 'might', 'mine', 'more', 'moreover', 'most', 'mostly', 'much', 'must', 'my', 'myself', 'namely', 'near', 'need', 'neither', 'never',
+    'nevertheless', 'next', 'no', 'nobody', 'none', 'noone', 'nor', 'not', 'nothing', 'now', 'nowhere', 'of', 'often', 'oftentimes', 'on', 'once', 'one',
+    'only', 'onto', 'or', 'other', 'others', 'otherwise', 'ought', 'our', 'ours', 'ourselves', 'out', 'outside', 'over', 'per', 'perhaps', 'rather', 're',
+    'same', 'second', 'shall', 'she', 'should', 'since', 'so', 'somehow', 'someone', 'something', 'sometime', 'sometimes', 'somehwere', 'still', 'such', 'than',
+    'that', 'the', 'their', 'theirs', 'them', 'themselves', 'then', 'there', 'therefore', 'these', 'they', 'third', 'this', 'though', 'through', 'throughout', 
+    'thru', 'thus', 'to', 'togehter', 'too', 'top', 'toward', 'towards', 'under', 'until', 'up', 'upon', 'us', 'used', 'very', 'was', 'we', 'well', 'were', 'what',
+    'whatever', 'when', 'whenever', 'whereas', 'whether', 'which', 'while', 'who', 'whoever', 'whose', 'why', 'will', 'with', 'within', 'without', 'would', 'yes',
+    'yet', 'you', 'your', 'yourself', 'yours', 'yourselves'
+})
+
+
+#spaCy part of speech -> WordNet part of speech (used to check word map replacements)
+WORDNET_POS = {"NOUN": wn.NOUN, "VERB": wn.VERB, "ADJ": wn.ADJ, "ADV": wn.ADV}
+
+
 class NLPSimplifier:
-    def __init__(self, adv_ele_path=None, subtlex_path=None):
-        self.word_map = {} #word map is a dictionary that maps words to their simplified forms (not currently used)
+    #low_memory turns on the low-memory serving profile: int8 quantized model and compact (marisa-trie) lexicons
+    #stub_model replaces the transformer with the deterministic stub from stub_model.py (offline load tests)
+    #shared_dir: memory-map the model weights and lexicons from this directory so worker processes share them
+    #(see shared_state.py, None loads a private copy)
+    #check_quantization=False skips comparing the quantized model with the full precision one, which runs the model
+    #(a process that forks workers after loading must not, see app.py)
+    def __init__(self, adv_ele_path=None, subtlex_path=None, low_memory=False, stub_model=False, shared_dir=None,
+                 check_quantization=True):
+        self.low_memory = low_memory
+        self.stub_model = stub_model
+        self.shared_dir = shared_dir
+        self.word_map = {} #word map is a dictionary that maps words to their simplified forms (used by the lexicon fast path)
+        self.word_map_cache = {} #word maps that were already built, by corpus file path
+        #human simplifications of the corpus sentences (exact-match lookup, see references.py)
+        self.reference_index = ReferenceIndex()
+        self.reference_index_cache = {} #reference indexes that were already built, by corpus file path
+        self.use_references = True
         self.freq_dict = {} #freq_dict is a dictionary that maps words to their frequency in the corpus
         #initializing WordNet for semantic relationships
         self.semantic_keywords = self._identify_semantic_keywords() #semantic keywords
         self.antonym_dict = self._build_antonym_dict() #antonyoms
+        if self.shared_dir:
+            #both are small to build but kept in every worker, so the built ones are swapped for mapped tries
+            #(named by their content, a WordNet update makes new files)
+            keywords, antonyms = self.semantic_keywords, self.antonym_dict
+            self.semantic_keywords = shared_lexicon(f"semantic_keywords-{content_version(keywords)}", CompactSet,
+                                                    lambda: keywords, self.shared_dir)
+            self.antonym_dict = shared_lexicon(f"antonyms-{content_version(antonyms)}", CompactStringMap,
+                                               lambda: antonyms, self.shared_dir)
         #initializing spaCy for POS tagging and context analysis
         self.spacy_nlp = spacy.load("en_core_web_sm")
-        self.user_difficulty_profile = {} #initializing user difficulty profile
+        #initializing user difficulty profile (the service sets the profile of the requesting user for each request)
+        self.user_difficulty_profile = {}
+        self.sentence_influence = set() #words whose difficulty decided the last simplify_sentence call
         self.current_tier = "adv-ele" #initializing current tier of text being used (ADV-ELE is default)
+        #difficulty gate for each tier: only words with a difficulty score of at least min_score
+        #(and within the top_fraction of a sentence's words, if set) are sent to the model
+        #no tier is gated unless set_difficulty_gate is called (the service sets the gates from tuning.py)
+        self.difficulty_gates = {}
+        self.reset_request_stats()
+        #decision records of the request being profiled (a list while profiling.RequestProfiler is active, otherwise None)
+        self.decision_trace = None
+        self.current_decision = None #record of the word being decided
 
-        #defining function words to not be simplified because if we replace them, we could drastically change the meaning of the sentence
-        #citation: https://semanticsimilarity.wordpress.com/function-word-lists/ (the 277 word list)
-        #i did delete some words because they were really difficult in the first place
-        self.function_words = {
-            'a', 'about', 'above', 'across', 'after', 'afterwards', 'against', 'again', 'all', 'almost', 'alone', 'along', 'already', 'also',
-            'although', 'always', 'am', 'among', 'an', 'and', 'another', 'any', 'anyhow', 'anyone', 'anything', 'anyway',
-            'anywhere', 'are', 'around', 'as', 'at', 'be', 'became', 'because', 'been', 'before', 'behind', 'being', 'below', 'beside',
-            'besides', 'betwen', 'beyond', 'both', 'but', 'by', 'can', 'cannot', 'could', 'dare', 'despite', 'did', 'do', 'does', 'done', 'down', 'during',
-            'each', 'eg', 'either', 'else', 'elsewhere', 'enough', 'etc', 'even', 'ever', 'everyone', 'everything', 'everywhere', 'except', 'few', 'first',
-            'for', 'former', 'formerly', 'from', 'further', 'had', 'has', 'have', 'he', 'hence', 'her', 'here', 
-            'hereby', 'hers', 'herself', 'him', 'himself', 'his', 'how', 'however',
-            'i', 'ie', 'if', 'in', 'indeed', 'inside', 'instead', 'into', 'is', 'it', 'its', 'itself', 'last', 'least', 'less', 'lot', 'lots', 'many', 'may', 'me',
-            'meanwhile', 'might', 'mine', 'more', 'moreover', 'most', 'mostly', 'much', 'must', 'my', 'myself', 'namely', 'near', 'need', 'neither', 'never',
-            'nevertheless', 'next', 'no', 'nobody', 'none', 'noone', 'nor', 'not', 'nothing', 'now', 'nowhere', 'of', 'often', 'oftentimes', 'on', 'once', 'one',
-            'only', 'onto', 'or', 'other', 'others', 'otherwise', 'ought', 'our', 'ours', 'ourselves', 'out', 'outside', 'over', 'per', 'perhaps', 'rather', 're',
-            'same', 'second', 'shall', 'she', 'should', 'since', 'so', 'somehow', 'someone', 'something', 'sometime', 'sometimes', 'somehwere', 'still', 'such', 'than',
-            'that', 'the', 'their', 'theirs', 'them', 'themselves', 'then', 'there', 'therefore', 'these', 'they', 'third', 'this', 'though', 'through', 'throughout', 
-            'thru', 'thus', 'to', 'togehter', 'too', 'top', 'toward', 'towards', 'under', 'until', 'up', 'upon', 'us', 'used', 'very', 'was', 'we', 'well', 'were', 'what',
-            'whatever', 'when', 'whenever', 'whereas', 'whether', 'which', 'while', 'who', 'whoever', 'whose', 'why', 'will', 'with', 'within', 'without', 'would', 'yes',
-            'yet', 'you', 'your', 'yourself', 'yours', 'yourselves'
-        }
+        self.function_words = set(FUNCTION_WORDS)
         
         #defining patterns in words that could be difficult for dyslexic readers
         self.dyslexic_difficult_patterns = [
@@ -66,16 +151,155 @@ class NLPSimplifier:
 
         #initializing the fill-mask transformer model - use distilled version for lower memory
         model_name = "distilroberta-base"
-        self.fill_mask = pipeline("fill-mask", model=model_name)
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name) 
-        self.mask_token = self.tokenizer.mask_token
+        if self.stub_model:
+            self.fill_mask = StubFillMask(latency_ms=float(os.environ.get('SIMPLIFIER_STUB_LATENCY_MS', 0)))
+            self.mask_token = self.fill_mask.mask_token
+        elif self.shared_dir:
+            #the weights stay in the mapped file, this process only keeps the module objects
+            self.fill_mask = pipeline("fill-mask", model=shared_model(model_name, self.shared_dir), tokenizer=model_name)
+            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+            self.mask_token = self.tokenizer.mask_token
+        else:
+            self.fill_mask = pipeline("fill-mask", model=model_name)
+            self.tokenizer = AutoTokenizer.from_pretrained(model_name) 
+            self.mask_token = self.tokenizer.mask_token
         self.has_transformer = True
+        self.model_top_k = 15 #predictions looked at for each contextual replacement
+        #batch sizes (tuned per machine by autotune.py, see tuning.py)
+        #spacy_batch_size: sentences per spaCy pipe batch when a text is parsed up front
+        #inference_batch_size: masked sentences per fill-mask call (1 = one call per word, no prefetching)
+        self.spacy_batch_size = 1
+        self.inference_batch_size = 1
+        self.parsed = {} #sentence -> spaCy doc for the sentences of the current text
+        self.prefetched = {} #(masked sentence, top_k) -> predictions fetched in a batch for the current sentence
+        #per-document memo of model replacements: (word, part of speech, tier) -> replacement
+        #only replacements the model was confident about (score >= memo_min_score) are reused
+        self.decision_memo = {}
+        self.memo_min_score = 0.1
+        self.last_prediction_score = None
+        self.model_quantized = False
+        self.quantization_agreement = None #top-k agreement of the quantized model with the full precision one
+        #fast mode picks replacements from the offline synonym index instead of the model (see synonym_index.py)
+        self.synonym_index = load_synonym_index()
+        self.fast_mode = False
+        #lexicon-only mode: the sentences are planned and get the word map, nothing goes to the model or the forced pass
+        self.lexicon_only = False
 
         #making sure that the word map and frequency dictionaries are loaded
         if adv_ele_path and os.path.exists(adv_ele_path):
-            self.word_map = self.build_word_map(adv_ele_path)
+            self.word_map = self.load_word_map(adv_ele_path)
+            self.reference_index = self.load_reference_index(adv_ele_path)
         if subtlex_path and os.path.exists(subtlex_path):
-            self.freq_dict = self.load_frequency_dict(subtlex_path)
+            if self.shared_dir:
+                name = f"freq-{os.path.basename(subtlex_path)}-{file_version(subtlex_path)}"
+                self.freq_dict = shared_lexicon(name, CompactFloatMap, lambda: self.load_frequency_dict(subtlex_path),
+                                                self.shared_dir)
+            else:
+                self.freq_dict = self.load_frequency_dict(subtlex_path)
+
+        if self.low_memory:
+            self.compact_lexicons()
+            if not self.stub_model:
+                check_path = adv_ele_path if adv_ele_path and os.path.exists(adv_ele_path) else None
+                check_sentences = self.agreement_check_sentences(check_path) if check_path and check_quantization else None
+                self.quantize_model(check_sentences)
+        self.measure_memory()
+
+    #this function swaps the lexicon dicts/sets for compact marisa-trie versions (low-memory profile)
+    #(lexicons that are already compact, e.g. mapped from the shared directory, are kept)
+    def compact_lexicons(self):
+
+        def compact(lexicon, compact_class):
+            return lexicon if isinstance(lexicon, compact_class) else compact_class(lexicon)
+
+        self.semantic_keywords = compact(self.semantic_keywords, CompactSet)
+        self.antonym_dict = compact(self.antonym_dict, CompactStringMap)
+        self.freq_dict = compact(self.freq_dict, CompactFloatMap)
+        self.word_map_cache = {path: compact(word_map, CompactStringMap) for path, word_map in self.word_map_cache.items()}
+        self.word_map = compact(self.word_map, CompactStringMap)
+        gc.collect()
+
+    #this function applies int8 dynamic quantization to the linear layers of the masked LM (low-memory profile)
+    #if check_sentences (with a mask token) are given, the top-k predictions of both models are compared
+    def quantize_model(self, check_sentences=None, top_k=5):
+        import torch
+        full_model = self.fill_mask.model
+        quantized = torch.ao.quantization.quantize_dynamic(full_model, {torch.nn.Linear}, dtype=torch.qint8)
+        if check_sentences:
+            self.quantization_agreement = self.topk_agreement(full_model, quantized, check_sentences, top_k)
+            logger.info(f"Quantized model top-{top_k} agreement: {self.quantization_agreement:.3f}")
+        self.fill_mask.model = quantized
+        self.model_quantized = True
+        #dropping the full precision weights
+        del full_model
+        gc.collect()
+        return self.quantization_agreement
+
+    #this function measures how much the top-k predictions of two models overlap on masked sentences
+    #(1.0 means both models always predict the same top-k words)
+    def topk_agreement(self, model_a, model_b, masked_sentences, top_k=5):
+        original_model = self.fill_mask.model
+        predictions = []
+        try:
+            for model in (model_a, model_b):
+                self.fill_mask.model = model
+                predictions.append([{pred['token_str'].strip().lower() for pred in self.fill_mask(masked, top_k=top_k)}
+                                    for masked in masked_sentences])
+        finally:
+            self.fill_mask.model = original_model
+        overlaps = [len(a & b) / top_k for a, b in zip(*predictions)]
+        return sum(overlaps) / len(overlaps) if overlaps else None
+
+    #this function makes masked sentences from a corpus file for the agreement check
+    #(the longest content word of the advanced sentence of each pair is masked)
+    def agreement_check_sentences(self, file_path, limit=20):
+        masked_sentences = []
+        with open(file_path, "r", encoding="utf-8") as f:
+            for pair in f.read().split("*******"):
+                lines = pair.strip().split("\n")
+                if len(lines) != 2:
+                    continue
+                words = [w for w in re.findall(r"[A-Za-z]+", lines[0]) if w.lower() not in self.function_words]
+                if not words:
+                    continue
+                target = max(words, key=len)
+                masked_sentences.append(re.sub(r'\b' + re.escape(target) + r'\b', self.mask_token, lines[0], count=1))
+                if len(masked_sentences) >= limit:
+                    break
+        return masked_sentences
+
+    #this function measures how much memory the model and each lexicon use and keeps the numbers for memory_report
+    #it walks every lexicon, so it is only called when they are loaded or swapped (with the simplifier to itself),
+    #never from /health (request threads add antonyms to antonym_dict while it would be iterating it)
+    def measure_memory(self):
+        self.component_bytes = {
+            "model_bytes": model_nbytes(self.fill_mask.model) if getattr(self.fill_mask, 'model', None) is not None else 0,
+            "lexicon_bytes": {
+                "word_map": deep_sizeof(self.word_map),
+                "word_map_cache": sum(deep_sizeof(word_map) for path, word_map in self.word_map_cache.items()),
+                "reference_index_cache": sum(deep_sizeof(index.references) for index in self.reference_index_cache.values()),
+                "synonym_index": deep_sizeof(self.synonym_index) if self.synonym_index is not None else 0,
+                "freq_dict": deep_sizeof(self.freq_dict),
+                "antonym_dict": deep_sizeof(self.antonym_dict),
+                "semantic_keywords": deep_sizeof(self.semantic_keywords),
+                "function_words": deep_sizeof(self.function_words)
+            }
+        }
+        return self.component_bytes
+
+    #this function reports roughly how much memory each part of the simplifier uses (for /health)
+    #(the process numbers are current, the model and lexicon sizes are from the last measure_memory)
+    def memory_report(self):
+        return {
+            "process_rss_bytes": process_rss_bytes(),
+            "process_private_bytes": process_private_bytes(),
+            "shared_weights": self.shared_dir is not None,
+            "model_bytes": self.component_bytes["model_bytes"],
+            "model_quantized": self.model_quantized,
+            "quantization_agreement": self.quantization_agreement,
+            "compact_lexicons": self.low_memory,
+            "lexicon_bytes": dict(self.component_bytes["lexicon_bytes"])
+        }
 
 
     #this function identifies semantic keywords to not subsitute them
@@ -159,8 +383,9 @@ class NLPSimplifier:
         return None
 
     #this function load's the user's difficulty profile which is a dictionary of words and their difficulty scores
+    #(only membership matters to the simplifier, not the scores)
     def load_user_difficulty_profile(self, word_scores: dict):
-        self.user_difficulty_profile = word_scores or {}
+        self.user_difficulty_profile = {word.lower(): score for word, score in (word_scores or {}).items()}
 
     #this function sets the simplification tier based on the user's diagnostic results
     def set_simplification_tier(self, tier='adv-ele'):
@@ -177,26 +402,244 @@ class NLPSimplifier:
         if file_tier is None:
             logger.info("Setting advanced level - no simplification will be applied")
             self.word_map = {}  
+            self.reference_index = ReferenceIndex()
             self.current_tier = 'advanced'
             return
         file_map = {
-            'adv-ele': 'simplifier/data/ADV-ELE.txt',
-            'adv-int': 'simplifier/data/ADV-INT.txt',
+            'adv-ele': os.path.join(DATA_DIR, 'ADV-ELE.txt'),
+            'adv-int': os.path.join(DATA_DIR, 'ADV-INT.txt'),
         }
         #loading the word map for the selected tier
         if file_tier in file_map and os.path.exists(file_map[file_tier]):
             logger.info(f"Loading simplifier data from {file_map[file_tier]}")
-            self.word_map = self.build_word_map(file_map[file_tier])
+            self.word_map = self.load_word_map(file_map[file_tier])
+            self.reference_index = self.load_reference_index(file_map[file_tier])
             self.current_tier = file_tier
+            self.measure_memory()
         else:
             logger.warning(f"Invalid or missing file for tier: {file_tier}")
 
+    #this function returns the word map for a corpus file, building it only the first time
+    #so switching tiers back and forth doesn't re-read the corpus
+    def load_word_map(self, file_path):
+        if file_path not in self.word_map_cache:
+            if self.shared_dir:
+                #named by the corpus file's version, so pairs appended to the corpus make a new map
+                name = f"word_map-{os.path.basename(file_path)}-{file_version(file_path)}"
+                word_map = shared_lexicon(name, CompactStringMap, lambda: self.build_word_map(file_path), self.shared_dir)
+            else:
+                word_map = self.build_word_map(file_path)
+            if self.low_memory and not self.shared_dir:
+                word_map = CompactStringMap(word_map)
+            self.word_map_cache[file_path] = word_map
+        return self.word_map_cache[file_path]
+
+    #this function returns the reference index of a corpus file, building it only the first time
+    def load_reference_index(self, file_path):
+        if file_path not in self.reference_index_cache:
+            try:
+                index = build_reference_index(file_path)
+            except Exception as e:
+                logger.error(f"Error building reference index: {e}")
+                index = ReferenceIndex()
+            if self.low_memory:
+                index.references = CompactStringMap(index.references)
+            self.reference_index_cache[file_path] = index
+        return self.reference_index_cache[file_path]
+
+    #this function returns the human simplification of a sentence from the corpus of the current tier (or None)
+    def reference_for(self, sentence):
+        if not self.use_references or not self.reference_index:
+            return None
+        return self.reference_index.get(sentence)
+
+    #this function splits a text into the units simplify_sentence works on: its sentences, except that consecutive
+    #sentences that together are one corpus line are kept together so they are looked up as a whole
+    def text_sentences(self, text):
+        sentences = sent_tokenize(text)
+        if not self.use_references or not self.reference_index:
+            return sentences
+        return self.reference_index.group_sentences(sentences)
+
+    #this function uses the reference simplification of a sentence and counts it like the pipeline's own replacements
+    #(the words of the sentence are checked words and the ones the reference changes are replacements)
+    def apply_reference(self, sentence, reference):
+        orig_tokens = self.tokenize_with_punctuation(sentence)
+        ref_tokens = self.tokenize_with_punctuation(reference)
+        self.total_words_checked += sum(1 for token in orig_tokens if token.isalpha())
+        sm = difflib.SequenceMatcher(None, orig_tokens, ref_tokens, autojunk=False)
+        for tag, i1, i2, j1, j2 in sm.get_opcodes():
+            if tag == "equal":
+                continue
+            self.replacement_count += sum(1 for token in orig_tokens[i1:i2] if token.isalpha())
+            #reasons for the edit list (same word for word split as compute_edits)
+            if tag == "replace" and i2 - i1 == j2 - j1:
+                for k in range(i2 - i1):
+                    self.record_replacement_reason(orig_tokens[i1 + k], ref_tokens[j1 + k], "reference")
+            else:
+                self.record_replacement_reason(''.join(orig_tokens[i1:i2]), ''.join(ref_tokens[j1:j2]), "reference")
+        self.request_stats["reference_sentences"] += 1
+        self.start_decision(sentence, "reference")
+        self.note_decision("replaced", "corpus reference", replacement=reference)
+        return reference
+
+    #this function resets the per-request statistics (where replacements came from and how many model calls were made)
+    def reset_request_stats(self):
+        self.request_stats = {
+            "lexicon_replacements": 0, #replacements taken from the word map
+            "model_replacements": 0, #replacements from the fill-mask model
+            "synonym_replacements": 0, #replacements from the synonym index (fast mode)
+            "forced_replacements": 0, #replacements from the forced pass
+            "model_calls": 0, #fill-mask forward passes
+            "model_calls_avoided": 0, #easy words that the difficulty gate kept away from the model
+            "memo_hits": 0, #repeated words replaced from the document's decision memo
+            "memo_lookups": 0, #words that went to the decision memo before the model
+            "reference_sentences": 0 #sentences answered with their human simplification from the corpus
+        }
+
+    #this function starts the decision record of a word (only while a request is profiled)
+    def start_decision(self, word, stage):
+        if self.decision_trace is None:
+            return
+        self.current_decision = {"word": word, "stage": stage, "decision": "kept", "reason": None,
+                                 "candidates_examined": 0, "model_ms": 0.0}
+        self.decision_trace.append(self.current_decision)
+
+    #this function fills in the decision record of the current word (does nothing when not profiling)
+    def note_decision(self, decision=None, reason=None, **details):
+        record = self.current_decision
+        if record is None:
+            return
+        if decision:
+            record["decision"] = decision
+        if reason:
+            record["reason"] = reason
+        record.update(details)
+
+    #this function gets the contextual (model) replacement of a word through the document's decision memo
+    #a word that already got a confident replacement in this document (same part of speech and tier) gets the same
+    #replacement again without running the model, so repeated words are replaced consistently
+    #the memo only saves the model call: the checks that depend on the sentence are run again for this one
+    def memoized_contextual_replacement(self, sentence, word, pos=None):
+        key = (word.lower(), pos, self.current_tier)
+        self.request_stats["memo_lookups"] += 1
+        if key in self.decision_memo:
+            replaceable, pos_info = self.check_replaceable(sentence, word)
+            if not replaceable:
+                return None
+            replacement = self.decision_memo[key]
+            if self.fits_sentence(sentence, word, replacement, pos_info):
+                self.request_stats["memo_hits"] += 1
+                self.note_decision(memo_hit=True)
+                return replacement
+            #the remembered replacement doesn't fit this sentence, the pipeline looks for one that does
+        if self.fast_mode:
+            replacement = self.get_synonym_replacement(sentence, word)
+        else:
+            replacement = self.get_contextual_replacement(sentence, word)
+        if replacement and self.last_prediction_score is not None and self.last_prediction_score >= self.memo_min_score:
+            self.decision_memo[key] = replacement
+        return replacement
+
+    #this function tells where contextual replacements come from right now ("model", or "synonym" in fast mode)
+    def contextual_source(self):
+        return "synonym" if self.fast_mode else "model"
+
+    #this function runs the fill-mask model on a masked sentence and counts the call
+    #(predictions already fetched in a batch by prefetch_predictions are used without running the model again)
+    def predict_masked(self, masked, top_k):
+        predictions = self.prefetched.pop((masked, top_k), None)
+        if predictions is not None:
+            return predictions
+        self.request_stats["model_calls"] += 1
+        return self.fill_mask(masked, top_k=top_k)
+
+    #this function masks the first occurrence of a word in a sentence (ignoring case)
+    def mask_word(self, sentence, word):
+        return re.sub(r'\b' + re.escape(word) + r'\b', self.mask_token, sentence, count=1, flags=re.IGNORECASE)
+
+    #this function runs the model on the masked sentences of several words in one pipeline call
+    #(the pipeline puts inference_batch_size of them through each forward pass)
+    #predict_masked then takes the predictions from self.prefetched instead of making one call per word
+    def prefetch_predictions(self, sentence, words, top_k=None):
+        top_k = top_k or self.model_top_k
+        masked_sentences = []
+        for word in words:
+            masked = self.mask_word(sentence, word)
+            if self.mask_token in masked and (masked, top_k) not in self.prefetched and masked not in masked_sentences:
+                masked_sentences.append(masked)
+        #a single sentence is no batch, predict_masked runs it when (and if) it is needed
+        if len(masked_sentences) < 2:
+            return
+        try:
+            outputs = self.fill_mask(masked_sentences, top_k=top_k, batch_size=self.inference_batch_size)
+        except Exception as e:
+            logger.error(f"Error during batched prediction: {e}")
+            return
+        self.request_stats["model_calls"] += len(masked_sentences)
+        for masked, predictions in zip(masked_sentences, outputs):
+            self.prefetched[(masked, top_k)] = predictions
+
+    #this function parses the sentences of a text up front (spacy_batch_size sentences per spaCy pipe batch)
+    #plan_sentence and get_pos_info then reuse these parses instead of parsing the same sentence again
+    def parse_sentences(self, sentences):
+        self.parsed = {}
+        if not self.spacy_nlp:
+            return
+        unique = list(dict.fromkeys(sentence for sentence in sentences if sentence.strip()))
+        #(the profiler replaces spacy_nlp with a plain function, which has no pipe)
+        pipe = getattr(self.spacy_nlp, 'pipe', None)
+        if self.spacy_batch_size > 1 and pipe is not None:
+            docs = pipe(unique, batch_size=self.spacy_batch_size)
+        else:
+            docs = (self.spacy_nlp(sentence) for sentence in unique)
+        self.parsed = dict(zip(unique, docs))
+
+    #this function returns the spaCy parse of a sentence (from parse_sentences if it was parsed up front)
+    def parse(self, sentence):
+        doc = self.parsed.get(sentence)
+        return doc if doc is not None else self.spacy_nlp(sentence)
+
+    #this function changes the difficulty gate of a tier (beginner/intermediate or adv-ele/adv-int)
+    #min_score and top_fraction can be None to turn that part of the gate off
+    def set_difficulty_gate(self, tier, min_score=None, top_fraction=None):
+        tier = self.gate_tier(tier)
+        if top_fraction is not None and not 0 < top_fraction <= 1:
+            raise ValueError("top_fraction must be between 0 and 1")
+        self.difficulty_gates[tier] = {'min_score': min_score, 'top_fraction': top_fraction}
+
+    #this function gets the name the difficulty gates use for a tier (beginner/intermediate -> adv-ele/adv-int)
+    def gate_tier(self, tier):
+        return {'beginner': 'adv-ele', 'intermediate': 'adv-int'}.get(tier.lower(), tier.lower())
+
+    #this function tells if the difficulty gate of a tier (default: the current one) filters any words
+    #the user's profile only changes a simplification through the gate, so without one every profile gets the same result
+    def gate_active(self, tier=None):
+        gate = self.difficulty_gates.get(self.gate_tier(tier or self.current_tier)) or {}
+        return gate.get('min_score') is not None or gate.get('top_fraction') is not None
+
+    #this function picks which candidate words of a sentence are worth a model call
+    #using the cheap difficulty score and the gate of the current tier (none in lexicon-only mode)
+    def gate_candidates(self, tokens, candidates):
+        if self.lexicon_only:
+            return set()
+        gate = self.difficulty_gates.get(self.current_tier)
+        if not gate:
+            return set(candidates)
+        scored = sorted(((self.word_difficulty_score(tokens[idx]), idx) for idx in candidates), reverse=True)
+        if gate.get('top_fraction') is not None:
+            keep = math.ceil(len(scored) * gate['top_fraction'])
+            scored = scored[:keep]
+        if gate.get('min_score') is not None:
+            scored = [(score, idx) for score, idx in scored if score >= gate['min_score']]
+        return {idx for _, idx in scored}
+
     #this function gets the part of speech, tag, dependency, tense, number, and lemma of a word in a sentence
     #this is used to ensure that the replacement word has the same part of speech, tag, dependency, tense, number, and lemma
     #as the original word
     def get_pos_info(self, sentence, target_word):
         #tokenizing the sentence using spacy
-        tokenized_sentence = self.spacy_nlp(sentence)
+        tokenized_sentence = self.parse(sentence)
         #for each token in the tokenized sentence
         for token in tokenized_sentence:
             #checking if the token is the target word (lower cased)
@@ -215,35 +658,36 @@ class NLPSimplifier:
         #if the word isn't found return None
         return None
 
-    #this function gets a contextual replacement for a word in a sentence
-    #which basically means that we take into account the context of the word in the sentence
-    def get_contextual_replacement(self, sentence, word, top_k=15):
-        #skip if word is a function word, too short, or if the transformer isn't available
-        if word.lower() in self.function_words or len(word) <= 2 or not self.has_transformer:
-            return None
+    #this function runs the checks a word has to pass before it is replaced in context
+    #(proper nouns and entities, semantic keywords, antonyms in the sentence, adjectives of semantic keywords)
+    #it returns (False, None) if the word has to be kept, otherwise (True, the POS info of the word)
+    def check_replaceable(self, sentence, word):
         #POS info to ensure we maintain the same part of speech
         pos_info = self.get_pos_info(sentence, word)
 
         #skip if proper noun or entity name
         if pos_info and pos_info.get("pos") == "NOUN":
             if pos_info.get("is_proper", False) or pos_info.get("ent_type") in ["GPE", "LOC", "ORG", "PERSON"]:
-                return None
+                self.note_decision(reason="proper noun or entity")
+                return False, None
             
         #skipping words with high semantic importance
         if self.is_semantic_keyword(word):
-            return None
+            self.note_decision(reason="semantic keyword")
+            return False, None
 
         #skipping potential antonym as replacement
         if pos_info and pos_info.get("lemma"):
             lemma = pos_info.get("lemma")
             antonym = self.find_antonym(lemma)
             if antonym and antonym in sentence.lower():
-                return None
+                self.note_decision(reason="antonym in sentence")
+                return False, None
                 
         #skip words that modify core semantic words
         #if the word is an adjective
         if pos_info and pos_info.get("pos") == "ADJ" and self.spacy_nlp: 
-            doc = self.spacy_nlp(sentence) #tokenizing sentenece
+            doc = self.parse(sentence) #tokenizing sentenece
             for token in doc: #for each token
                 #if the token is the target word
                 if token.text.lower() == word.lower():
@@ -251,10 +695,26 @@ class NLPSimplifier:
                     for child in token.children:
                         #if the child is a noun and semantic keyword, skip
                         if child.pos_ == "NOUN" and self.is_semantic_keyword(child.text): 
-                            return None
+                            self.note_decision(reason="modifies a semantic keyword")
+                            return False, None
                     #if the head of the token is a noun and semantic keyword, skip
                     if token.head.pos_ == "NOUN" and self.is_semantic_keyword(token.head.text):
-                        return None
+                        self.note_decision(reason="modifies a semantic keyword")
+                        return False, None
+        return True, pos_info
+
+    #this function gets a contextual replacement for a word in a sentence
+    #which basically means that we take into account the context of the word in the sentence
+    def get_contextual_replacement(self, sentence, word, top_k=None):
+        top_k = top_k or self.model_top_k
+        self.last_prediction_score = None #model score of the returned replacement (for the decision memo)
+        #skip if word is a function word, too short, or if the transformer isn't available
+        if word.lower() in self.function_words or len(word) <= 2 or not self.has_transformer:
+            self.note_decision(reason="function word or too short")
+            return None
+        replaceable, pos_info = self.check_replaceable(sentence, word)
+        if not replaceable:
+            return None
                         
         #for words with more than 5 chars (instead of 6), replace aggressively
         if len(word) > 5 and word.isalpha():
@@ -263,13 +723,14 @@ class NLPSimplifier:
         if self.has_transformer:
             try:
                 #masking the word with the mask token
-                masked = re.sub(r'\b' + re.escape(word) + r'\b', self.mask_token, sentence, count=1, flags=re.IGNORECASE)
+                masked = self.mask_word(sentence, word)
                 if self.mask_token not in masked:
                     return None
                 #getting the predictions from the model
-                predictions = self.fill_mask(masked, top_k=top_k)
+                predictions = self.predict_masked(masked, top_k)
                 #filtering and ranking predictions
-                for pred in predictions:
+                for examined, pred in enumerate(predictions, 1):
+                    self.note_decision(candidates_examined=examined)
                     #getting the predicted word
                     pred_word = pred['token_str'].lower().strip()
                     #skip if it's the same word, a function word, too short, or non-alphabetic
@@ -278,18 +739,10 @@ class NLPSimplifier:
                         len(pred_word) < 2 or 
                         not pred_word.isalpha()):
                         continue
-                    #skip if the prediction is an antonym of a word in the sentence
-                    antonym = self.find_antonym(pred_word)
-                    if antonym and antonym in sentence.lower():
+                    #skip if the prediction is an antonym of a word in the sentence or has another part of speech
+                    if not self.fits_sentence(sentence, word, pred_word, pos_info):
                         continue
-                    #checking if it has a similar POS tag (important for context)
-                    if pos_info:
-                        cand_info = self.get_pos_info(sentence.replace(word, pred_word), pred_word)
-                        if not cand_info:
-                            continue
-                        #making sure there's grammatical compatibility - be less strict
-                        if pos_info['pos'] != cand_info['pos'] and pos_info['pos'] not in ["ADJ", "ADV"]: 
-                            continue
+                    self.last_prediction_score = pred.get('score', 0.0)
                     
                     #if the length of the word is greater than 5 and it has a difficult pattern
                     if len(word) > 5 and has_difficult_pattern:
@@ -300,8 +753,46 @@ class NLPSimplifier:
                     #checking if the replacement is actually simpler for dyslexic readers
                     if self.is_better_for_dyslexia(pred_word, word):
                         return pred_word 
+                self.note_decision(reason="no simpler prediction")
             except Exception as e:
                 logger.error(f"Error during contextual replacement: {e}")
+                self.note_decision(reason=f"model error: {e}")
+        return None
+
+    #this function checks a replacement against the sentence it goes into: it can't be the antonym of a word in the
+    #sentence and has to keep the part of speech of the word (pos_info from check_replaceable)
+    def fits_sentence(self, sentence, word, candidate, pos_info):
+        antonym = self.find_antonym(candidate)
+        if antonym and antonym in sentence.lower():
+            return False
+        #checking if it has a similar POS tag (important for context)
+        if pos_info:
+            cand_info = self.get_pos_info(sentence.replace(word, candidate), candidate)
+            if not cand_info:
+                return False
+            #making sure there's grammatical compatibility - be less strict
+            if pos_info['pos'] != cand_info['pos'] and pos_info['pos'] not in ["ADJ", "ADV"]:
+                return False
+        return True
+
+    #this function gets a replacement for a word from the synonym index (fast mode, no model call)
+    #the neighbours are already simpler words, so only the checks that depend on the sentence are left
+    def get_synonym_replacement(self, sentence, word):
+        self.last_prediction_score = None #similarity of the returned replacement (for the decision memo)
+        if word.lower() in self.function_words or len(word) <= 2 or self.synonym_index is None:
+            self.note_decision(reason="function word or too short")
+            return None
+        replaceable, pos_info = self.check_replaceable(sentence, word)
+        if not replaceable:
+            return None
+        for examined, (candidate, similarity) in enumerate(self.synonym_index.neighbours(word), 1):
+            self.note_decision(candidates_examined=examined)
+            #same sentence checks as for the model's predictions
+            if not self.fits_sentence(sentence, word, candidate, pos_info):
+                continue
+            self.last_prediction_score = similarity
+            return candidate
+        self.note_decision(reason="no simpler synonym")
         return None
 
     #function checks if a candidate word replacement is actually better for dyslexia
@@ -391,45 +882,22 @@ class NLPSimplifier:
         return count
 
     #this function builds the word map which is a dictionary of words and their replacements
-    #from the adv-ele and adv-int files (not used in the current version)
-    def build_word_map(self, file_path, min_count=1):
-        word_map = defaultdict(list) #dictionary of words and their replacements
-        pair_counts = defaultdict(int) #dictionary of word pairs and their counts
+    #from the adv-ele and adv-int files (used by the lexicon fast path in simplify_sentence)
+    #the substitution counts come from word_map_builder, which streams the corpus, aligns the pairs in parallel
+    #for large files and only aligns pairs that were appended since the counts were last saved
+    def build_word_map(self, file_path, min_count=1, workers=None):
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read()
-                pairs = content.split("*******")
-
-                for pair in pairs:
-                    lines = pair.strip().split("\n")
-                    if len(lines) != 2:
-                        continue
-
-                    adv_sent, ele_sent = lines
-                    adv_words = word_tokenize(adv_sent.lower())
-                    ele_words = word_tokenize(ele_sent.lower())
-
-                    sm = difflib.SequenceMatcher(None, adv_words, ele_words)
-                    for tag, i1, i2, j1, j2 in sm.get_opcodes():
-                        if tag == "replace" and i2 - i1 == 1 and j2 - j1 == 1:
-                            adv_word = adv_words[i1]
-                            ele_word = ele_words[j1]
-                            if (not adv_word.isalpha() or not ele_word.isalpha() or
-                                    adv_word in self.function_words or ele_word in self.function_words):
-                                continue
-                            if adv_word != ele_word: #if the words are not the same
-                                #if the word is a semantic keyword, skip
-                                if self.is_semantic_keyword(adv_word) or self.is_semantic_keyword(ele_word):
-                                    continue
-                                #if the words are antonyms, skip
-                                if self.find_antonym(adv_word) == ele_word:
-                                    continue
-                                #add the word and the replacement to the word map
-                                word_map[adv_word].append(ele_word)
-                                pair_counts[(adv_word, ele_word)] += 1
+            pair_counts = update_pair_counts(file_path, self.function_words, workers=workers)
             final_dict = {}
+            #checking each distinct substitution once
             for (src, tgt), count in pair_counts.items():
                 if count >= min_count:
+                    #if the word is a semantic keyword, skip
+                    if self.is_semantic_keyword(src) or self.is_semantic_keyword(tgt):
+                        continue
+                    #if the words are antonyms, skip
+                    if self.find_antonym(src) == tgt:
+                        continue
                     if src not in final_dict or count > pair_counts.get((src, final_dict[src]), 0):
                         #additional check to make sure the replacement is simpler
                         if self.is_simpler(tgt, src):
@@ -441,6 +909,8 @@ class NLPSimplifier:
 
     #this function loads the frequency dictionary data which is a dictionary of words and their frequencies
     def load_frequency_dict(self, file_path):
+        #pandas is only imported here (and released afterwards) since nothing else needs it
+        import pandas as pd
         #loading the frequency dictionary data
         try:
             if file_path.endswith('.xlsx'):
@@ -475,6 +945,9 @@ class NLPSimplifier:
                 word = str(row[word_col]).lower() #get the word and make it lowercase
                 freq = float(row[freq_col]) #get the frequency
                 freq_dict[word] = freq #add the word and the frequency to the dictionary
+        #releasing the dataframe
+        del df
+        gc.collect()
         return freq_dict
 
     #this function checks if a word is simpler than another word
@@ -483,9 +956,10 @@ class NLPSimplifier:
         return self.is_better_for_dyslexia(word1, word2)
 
     #this function checks if a word is difficult for a dyslexic reader
-    def is_difficult_word(self, word):
+    #(profile is a user's difficult words, by default the one loaded for the current request)
+    def is_difficult_word(self, word, profile=None):
         #the word was tagged by the user as difficult then it is
-        if word.lower() in self.user_difficulty_profile:
+        if word.lower() in (self.user_difficulty_profile if profile is None else profile):
             return True
         
         #skipping short or non-alphabetic words
@@ -515,31 +989,257 @@ class NLPSimplifier:
 
     #this function simplifies the text by replacing complex words with simpler altneratives
     #it also forces additional replacements to meet minimum threshold (10% by specification)
-    def simplify_text(self, text, verbose=True):
+    #if deadline_ms is given, the model is only used while there is time left in the budget
+    #and the words that didn't get a model pass are stored in self.skipped_words
+    #(the budget starts on entry, and sentences are then parsed one at a time as they are planned, so parsing counts
+    #against it too)
+    #enforce_minimum=False skips the forced pass (document mode enforces the minimum once for the whole document)
+    #new_document=False keeps the decision memo of the previous call (the parts of one document in document mode)
+    def simplify_text(self, text, verbose=True, deadline_ms=None, enforce_minimum=True, new_document=True):
+        #absolute deadline (monotonic clock) or None if there is no time limit
+        deadline = time.monotonic() + max(deadline_ms, 0) / 1000.0 if deadline_ms is not None else None
         #tokenizing the text
-        sentences = sent_tokenize(text)
-        simplified_sentences = [] #list of simplified sentences
+        sentences = self.text_sentences(text)
+        if deadline is None:
+            self.parse_sentences(sentences)
+        else:
+            self.parsed = {}
+        if new_document:
+            self.decision_memo = {}
         self.replacement_count = 0
         self.total_words_checked = 0
+        self.skipped_words = [] #words that were not sent to the model because the budget ran out
+        self.replacement_reasons = {} #(original, replacement) -> where the replacement came from (for compute_edits)
+        self.reset_request_stats()
         self.min_replacement_percentage = 10.0  #min replacement percentage
 
-        for sentence in sentences: #for each sentence
-            simplified = self.simplify_sentence(sentence, verbose) #simplify it
-            simplified_sentences.append(simplified) #add it to the list
+        if deadline is None:
+            simplified_sentences = [] #list of simplified sentences
+            for sentence in sentences: #for each sentence
+                simplified = self.simplify_sentence(sentence, verbose) #simplify it
+                simplified_sentences.append(simplified) #add it to the list
+        else:
+            simplified_sentences = self.simplify_sentences_within_deadline(sentences, deadline)
 
-        #checking if we need to force more replacements to meet minimum threshold
         simplified_text = ' '.join(simplified_sentences)
+        if enforce_minimum:
+            simplified_text = self.enforce_minimum_replacements(simplified_text, deadline)
+        return simplified_text
+
+    #this function simplifies a long text paragraph by paragraph, keeping its line breaks
+    #long documents are split into chunks that are simplified in parallel worker processes (see document.py)
+    #the minimum replacement percentage is enforced over the whole document, not per paragraph
+    def simplify_document(self, text, workers=None, deadline_ms=None):
+        deadline = time.monotonic() + max(deadline_ms, 0) / 1000.0 if deadline_ms is not None else None
+        paragraphs, separators = split_paragraphs(text)
+        simplified_paragraphs, counters = simplify_paragraphs(self, paragraphs, workers, deadline)
+        #the request state as if the whole document went through simplify_text
+        self.restore_counters(counters)
+        simplified_text = join_paragraphs(simplified_paragraphs, separators)
+        return self.enforce_minimum_replacements(simplified_text, deadline)
+
+    #this function sets the request state (counters, reasons, skipped words) from merged counters
+    def restore_counters(self, counters):
+        self.replacement_count = counters["replacement_count"]
+        self.total_words_checked = counters["total_words_checked"]
+        self.skipped_words = list(counters["skipped_words"])
+        self.replacement_reasons = dict(counters["replacement_reasons"])
+        self.reset_request_stats()
+        for key, value in counters["request_stats"].items():
+            self.request_stats[key] = self.request_stats.get(key, 0) + value
+        self.min_replacement_percentage = 10.0
+
+    #this function simplifies a text like simplify_text (without a deadline) and also returns a record per sentence:
+    #its output, its counters and the words whose difficulty scores decided it (influence)
+    #with the records, resimplify_text only redoes the sentences another difficulty profile can affect
+    def simplify_text_with_records(self, text):
+        self.decision_memo = {}
+        sentences = self.text_sentences(text)
+        self.parse_sentences(sentences)
+        records = [self.simplify_sentence_with_record(sentence) for sentence in sentences]
+        return self.assemble_records(records), records
+
+    #this function re-simplifies only the sentences whose influence words are in changed_words
+    #(changed_words=None redoes every sentence) and reuses the other records
+    #it returns the new text, the new records and how many sentences were redone
+    def resimplify_text(self, records, changed_words=None):
+        changed = {word.lower() for word in changed_words} if changed_words is not None else None
+        new_records = []
+        redone = 0
+        self.decision_memo = {}
+        if changed is None:
+            self.parse_sentences([record["sentence"] for record in records])
+        else:
+            self.parse_sentences([record["sentence"] for record in records if changed.intersection(record["influence"])])
+        for record in records:
+            if changed is None or changed.intersection(record["influence"]):
+                record = self.simplify_sentence_with_record(record["sentence"])
+                redone += 1
+            else:
+                #the memo entries a reused sentence made, as if it had just been simplified
+                for key, replacement in record.get("memo", []):
+                    self.decision_memo.setdefault(tuple(key), replacement)
+            new_records.append(record)
+        return self.assemble_records(new_records), new_records, redone
+
+    #this function simplifies one sentence with fresh counters and records the result
+    def simplify_sentence_with_record(self, sentence):
+        self.replacement_count = 0
+        self.total_words_checked = 0
+        self.skipped_words = []
+        self.replacement_reasons = {}
+        self.reset_request_stats()
+        self.sentence_influence = set()
+        memo_before = set(self.decision_memo)
+        output = self.simplify_sentence(sentence)
+        return {
+            "sentence": sentence,
+            "output": output,
+            "influence": sorted(self.sentence_influence),
+            "memo": [[list(key), replacement] for key, replacement in self.decision_memo.items() if key not in memo_before],
+            "counters": {
+                "replacement_count": self.replacement_count,
+                "total_words_checked": self.total_words_checked,
+                "request_stats": dict(self.request_stats),
+                "replacement_reasons": dict(self.replacement_reasons),
+                "skipped_words": list(self.skipped_words)
+            }
+        }
+
+    #this function puts sentence records together like simplify_text does (joining, then the forced pass)
+    def assemble_records(self, records):
+        counters = new_counters()
+        for record in records:
+            merge_counters(counters, record["counters"])
+        self.restore_counters(counters)
+        return self.enforce_minimum_replacements(' '.join(record["output"] for record in records))
+
+    #this function forces more replacements if the text is below the minimum replacement percentage
+    #(only if there is time left before the deadline)
+    def enforce_minimum_replacements(self, text, deadline=None):
         replacement_percentage = 0
         if self.total_words_checked > 0:
             replacement_percentage = (self.replacement_count / self.total_words_checked) * 100
-        
-        #if we didn't reach the minimum threshold, force more replacements
         if replacement_percentage < self.min_replacement_percentage and self.total_words_checked >= 10:
-            simplified_text = self.force_additional_replacements(simplified_text, replacement_percentage)
-        return simplified_text
+            if not self.deadline_passed(deadline) and not self.lexicon_only:
+                text = self.force_additional_replacements(text, replacement_percentage, deadline)
+        return text
+
+    #this function checks if the deadline (from time.monotonic) has passed
+    #no deadline means there is always time left
+    def deadline_passed(self, deadline):
+        return deadline is not None and time.monotonic() >= deadline
+
+    #this function simplifies sentences under a latency budget
+    #all candidate words of all sentences are ranked by difficulty so the model is spent on the hardest words first
+    #once the budget runs out the remaining words only get the cheap word map substitution
+    #planning (spaCy parse, WordNet checks) takes time too, so sentences reached after the deadline aren't parsed:
+    #their words only get the word map, see plan_sentence_without_parse
+    def simplify_sentences_within_deadline(self, sentences, deadline):
+        plans = [] #tokens, candidate positions and POS for each sentence
+        for sentence in sentences:
+            #corpus sentences get their human simplification right away, the others are planned
+            reference = self.reference_for(sentence)
+            if reference is not None:
+                plans.append(([self.apply_reference(sentence, reference)], [], {}))
+            elif self.deadline_passed(deadline):
+                plans.append(self.plan_sentence_without_parse(sentence))
+            else:
+                plans.append(self.plan_sentence(sentence))
+        #ranking every candidate word in the text (hardest first)
+        ranked = []
+        model_candidates = set() #(sentence, token) positions that passed the difficulty gate
+        for sentence_idx, (tokens, candidates, _) in enumerate(plans):
+            model_candidates.update((sentence_idx, idx) for idx in self.gate_candidates(tokens, candidates))
+            for token_idx in candidates:
+                ranked.append((self.word_difficulty_score(tokens[token_idx]), sentence_idx, token_idx))
+        ranked.sort(key=lambda x: x[0], reverse=True)
+
+        for _, sentence_idx, token_idx in ranked:
+            tokens, _, pos_map = plans[sentence_idx]
+            token = tokens[token_idx]
+            self.start_decision(token, "sentence")
+            #the word map is cheap so it is always tried first
+            if self.apply_replacement(tokens, token_idx, self.get_lexicon_replacement(token, pos_map.get(token_idx)), "lexicon"):
+                continue
+            if (sentence_idx, token_idx) not in model_candidates:
+                self.count_avoided_model_call(token)
+            elif not self.deadline_passed(deadline):
+                replacement = self.memoized_contextual_replacement(sentences[sentence_idx], token, pos_map.get(token_idx))
+                self.apply_replacement(tokens, token_idx, replacement, self.contextual_source())
+            #out of time - reporting the word as skipped
+            #(only words the model would actually have looked at)
+            elif token.lower() not in self.function_words and len(token) > 2:
+                self.skipped_words.append(token)
+                self.note_decision("skipped", "deadline passed")
+        return [''.join(tokens) for tokens, _, _ in plans]
+
+    #this function plans a sentence reached after the deadline without parsing it (no spaCy, no context checks)
+    #its candidates are the content words of the word map, with the part of speech WordNet gives the word when it
+    #has only one (get_lexicon_replacement needs a part of speech); the deadline has passed, so they only get the
+    #word map and the ones it doesn't replace are reported as skipped
+    def plan_sentence_without_parse(self, sentence):
+        tokens = self.tokenize_with_punctuation(sentence)
+        candidates = []
+        pos_map = {}
+        for idx, token in enumerate(tokens):
+            if not token.isalpha():
+                continue
+            self.total_words_checked += 1
+            if token.lower() in self.function_words or len(token) <= 2:
+                continue
+            candidates.append(idx)
+            if token.lower() in self.word_map:
+                pos = self.unambiguous_pos(token)
+                if pos is not None:
+                    pos_map[idx] = pos
+        return tokens, candidates, pos_map
+
+    #this function gets the part of speech of a word without its sentence: the spaCy name of the one WordNet part of
+    #speech all its senses have, or None if it has several (or none)
+    def unambiguous_pos(self, word):
+        parts = {'a' if synset.pos() == 's' else synset.pos() for synset in wn.synsets(word.lower())}
+        if len(parts) != 1:
+            return None
+        part = parts.pop()
+        return next((pos for pos, wordnet_pos in WORDNET_POS.items() if wordnet_pos == part), None)
+
+    #this function scores how difficult a word probably is using only cheap lexical signals
+    #(length, syllables, difficult patterns, frequency and the user's profile) so words can be ranked before any model call
+    def word_difficulty_score(self, word):
+        lowered = word.lower()
+        if not word.isalpha() or lowered in self.function_words:
+            return 0.0
+        score = len(word) + self.count_syllables(word) #longer words with more syllables are harder
+        #difficult patterns for dyslexic readers (same weight as in force_additional_replacements)
+        score += sum(2 for pattern in self.dyslexic_difficult_patterns if pattern in lowered)
+        #rare words are harder (3.5 is the same cut-off used in is_difficult_word)
+        if self.freq_dict and lowered in self.freq_dict:
+            score += max(0.0, 3.5 - self.freq_dict[lowered]) * 2
+        #words the user has marked as difficult go first
+        if lowered in self.user_difficulty_profile:
+            score += 10
+        return float(score)
+
+    #this function gets a replacement from the word map (no model call)
+    #pos is the spaCy part of speech of the word in the sentence; the replacement has to be usable
+    #as the same part of speech in WordNet, since the word map itself doesn't know about context
+    #without a part of speech (spaCy split the word differently, e.g. contractions) the map isn't used
+    def get_lexicon_replacement(self, word, pos=None):
+        replacement = self.word_map.get(word.lower())
+        if not replacement or replacement == word.lower():
+            return None
+        #only content words are in the word map
+        if pos not in WORDNET_POS:
+            return None
+        if not wn.synsets(replacement, pos=WORDNET_POS[pos]):
+            return None
+        if not self.is_better_for_dyslexia(replacement, word):
+            return None
+        return replacement
 
     #function to force additional replacements to meet minimum threshold (10% by specification)
-    def force_additional_replacements(self, text, current_percentage):
+    def force_additional_replacements(self, text, current_percentage, deadline=None):
         if self.total_words_checked < 10:  #if the total amount of words is < 10, there's not enough words to process
             return text
         #calculating how many more words we need to replace
@@ -575,6 +1275,10 @@ class NLPSimplifier:
             #if the number of replaced words is greater than or equal to the number of additional words needed, break
             if replaced_count >= additional_needed:
                 break
+            #stop if we are out of time
+            if self.deadline_passed(deadline):
+                break
+            self.start_decision(word, "forced")
             replacement = self.get_forced_replacement(sentence, word)
             if replacement and replacement != word: #if the replacement is not the same as the og word
                 #replace in the text (preserve capitalization)
@@ -585,6 +1289,9 @@ class NLPSimplifier:
                 text = re.sub(pattern, replacement, text, count=1)
                 #increment replacement count
                 self.replacement_count += 1
+                self.request_stats["forced_replacements"] += 1
+                self.record_replacement_reason(word, replacement, "forced")
+                self.note_decision("replaced", "forced", replacement=replacement)
                 replaced_count += 1
         return text
         
@@ -601,12 +1308,22 @@ class NLPSimplifier:
         if self.is_semantic_keyword(word):
             return None
 
-        if self.has_transformer:
+        if self.fast_mode and self.synonym_index is not None:
+            #fast mode never runs the model, the closest synonyms stand in for its predictions
+            predictions = [{'token_str': candidate} for candidate, _ in self.synonym_index.neighbours(word)[:5]]
+        elif self.has_transformer:
             try:
-                masked = re.sub(r'\b' + re.escape(word) + r'\b', self.mask_token, sentence, count=1, flags=re.IGNORECASE)
+                masked = self.mask_word(sentence, word)
                 if self.mask_token not in masked:
                     return None
-                predictions = self.fill_mask(masked, top_k=5) #get the top 5 predictions
+                predictions = self.predict_masked(masked, 5) #get the top 5 predictions
+            except Exception as e:
+                logger.error(f"Error during forced replacement: {e}")
+                predictions = []
+        else:
+            predictions = []
+        if predictions:
+            try:
                 #for each prediction
                 for pred in predictions:
                     #get the prediction word (lowercase and stripped)
@@ -653,12 +1370,62 @@ class NLPSimplifier:
         #skipping empty sentences
         if not sentence or not sentence.strip():
             return sentence
+        #a sentence of the corpus gets its human simplification (the profile can't change it)
+        reference = self.reference_for(sentence)
+        if reference is not None:
+            self.sentence_influence = set()
+            return self.apply_reference(sentence, reference)
+        tokens, candidates, pos_map = self.plan_sentence(sentence)
+        #the user's profile changes decisions only through the difficulty scores of these words in the gate
+        self.sentence_influence = {tokens[idx].lower() for idx in candidates} if self.gate_active() else set()
+        model_candidates = self.gate_candidates(tokens, candidates) #words difficult enough for a model call
+        if self.inference_batch_size > 1 and not self.fast_mode:
+            self.prefetch_sentence(sentence, tokens, candidates, model_candidates, pos_map)
+        #for each word that could be replaced
+        for token_idx in candidates:
+            token = tokens[token_idx]
+            self.start_decision(token, "sentence")
+            #fast path: substitution from the word map (no model call)
+            if self.apply_replacement(tokens, token_idx, self.get_lexicon_replacement(token, pos_map.get(token_idx)), "lexicon"):
+                continue
+            #easy words don't go to the model
+            if token_idx not in model_candidates:
+                self.count_avoided_model_call(token)
+                continue
+            #getting a contextual replacement for words the word map doesn't cover
+            replacement = self.memoized_contextual_replacement(sentence, token, pos_map.get(token_idx))
+            self.apply_replacement(tokens, token_idx, replacement, self.contextual_source())
+        self.prefetched = {} #predictions of words that didn't need the model after all
+        #re-assemble the simplified sentence
+        simplified_sentence = ''.join(tokens)
+        return simplified_sentence
+
+    #this function fetches the model predictions of the words of a sentence that will probably need the model
+    #(gated candidates the word map and the decision memo don't cover) with one batched pipeline call
+    def prefetch_sentence(self, sentence, tokens, candidates, model_candidates, pos_map):
+        words = []
+        for token_idx in candidates:
+            token = tokens[token_idx]
+            pos = pos_map.get(token_idx)
+            if (token_idx not in model_candidates or token.lower() in self.function_words or len(token) <= 2
+                    or (token.lower(), pos, self.current_tier) in self.decision_memo
+                    or self.get_lexicon_replacement(token, pos)):
+                continue
+            words.append(token)
+        self.prefetch_predictions(sentence, words)
+
+    #this function splits a sentence into tokens and finds the positions of the words that could be replaced
+    #(it skips punctuation, preserved nouns/entities and semantic keywords)
+    #it also returns the part of speech of each word from the spaCy parse (token position -> part of speech)
+    def plan_sentence(self, sentence):
         #tracking words that should be preserved as-is
         preserve_map = {}
+        spans = {} #(start, end) character offsets of a spaCy token -> its part of speech
         #analyzing sentence with spaCy
-        if self.spacy_nlp:
-            tokenized_sentence = self.spacy_nlp(sentence) #tokenizing sentence
+        if self.spacy_nlp and sentence.strip():
+            tokenized_sentence = self.parse(sentence) #tokenizing sentence
             for token in tokenized_sentence:
+                spans[(token.idx, token.idx + len(token.text))] = token.pos_
                 #identifying proper nouns, named entities, and nouns to preserve
                 if token.pos_ == "PROPN" or token.ent_type_ in ["PERSON", "GPE", "LOC", "ORG"]:
                     preserve_map[token.text] = True
@@ -667,53 +1434,70 @@ class NLPSimplifier:
                     preserve_map[token.text] = True     
         #splitting sentence into words and punctuation
         tokens = self.tokenize_with_punctuation(sentence)
-        simplified_tokens = [] #list of simplified tokens
-        
-        #for replacements made and checked words
-        replacements_made = []
-        checked_words = 0
-        
+        #part of speech of each token, from the spaCy token at the same offsets (the tokens cover the whole sentence)
+        #a word spaCy split differently (e.g. "don" of "don't", spaCy has "do" and "n't") gets none
+        pos_map = {}
+        offset = 0
+        for idx, token in enumerate(tokens):
+            pos = spans.get((offset, offset + len(token)))
+            if pos is not None:
+                pos_map[idx] = pos
+            offset += len(token)
+        candidates = [] #positions of the tokens that could be replaced
         #for each token
-        for token in tokens:
+        for idx, token in enumerate(tokens):
             #preserve punctuation
             if token in string.punctuation or not token.strip():
-                simplified_tokens.append(token)
                 continue 
-                
             #counting the words that are checked
             if token.strip() and token.isalpha():
-                checked_words += 1
                 if hasattr(self, 'total_words_checked'):
                     self.total_words_checked += 1
-                
             #skip simplification for preserved words
             if token in preserve_map:
-                simplified_tokens.append(token)
+                self.start_decision(token, "plan")
+                self.note_decision("skipped", "preserved noun or entity")
                 continue
-                
             #skip semantic keywords
             if self.is_semantic_keyword(token):
-                simplified_tokens.append(token)
+                self.start_decision(token, "plan")
+                self.note_decision("skipped", "semantic keyword")
                 continue
-                
-            #getting a contextual replacement
-            replacement = self.get_contextual_replacement(sentence, token)
-            if replacement and replacement != token: #if there is a replacement and it's different from the original
-                #preserve capitalization
-                if token[0].isupper() and len(replacement) > 0:
-                    replacement = replacement[0].upper() + replacement[1:]
-                simplified_tokens.append(replacement) #add the replacement to the list
-                # Log the replacement
-                replacements_made.append((token, replacement))
-                # Track replacement count
-                if hasattr(self, 'replacement_count'):
-                    self.replacement_count += 1
-            else:
-                simplified_tokens.append(token)
-                
-        #re-assemble the simplified sentence
-        simplified_sentence = ''.join(simplified_tokens)
-        return simplified_sentence
+            candidates.append(idx)
+        return tokens, candidates, pos_map
+
+    #this function counts a word that was kept away from the model by the difficulty gate
+    #(function words and very short words never reach the model anyway so they aren't counted)
+    def count_avoided_model_call(self, word):
+        if word.lower() not in self.function_words and len(word) > 2:
+            self.request_stats["model_calls_avoided"] += 1
+            self.note_decision("skipped", "below difficulty gate")
+        else:
+            self.note_decision("skipped", "function word or too short")
+
+    #this function puts a replacement into the token list (preserving capitalization) and counts it
+    #source says where the replacement came from ("lexicon" or "model") for the request stats
+    def apply_replacement(self, tokens, idx, replacement, source="model"):
+        token = tokens[idx]
+        if not replacement or replacement == token: #if there is no replacement or it's the same as the original
+            return False
+        #preserve capitalization
+        if token[0].isupper() and len(replacement) > 0:
+            replacement = replacement[0].upper() + replacement[1:]
+        tokens[idx] = replacement
+        #track replacement count
+        if hasattr(self, 'replacement_count'):
+            self.replacement_count += 1
+        self.request_stats[f"{source}_replacements"] += 1
+        self.record_replacement_reason(token, replacement, source)
+        self.note_decision("replaced", source, replacement=replacement)
+        return True
+
+    #this function remembers where a replacement came from so compute_edits can report it
+    def record_replacement_reason(self, original, replacement, reason):
+        if not hasattr(self, 'replacement_reasons'):
+            self.replacement_reasons = {}
+        self.replacement_reasons[(original.lower(), replacement.lower())] = reason
 
     #this function tokenizes text while preserving punctuation and spacing
     def tokenize_with_punctuation(self, text):
@@ -743,16 +1527,58 @@ class NLPSimplifier:
             tokens.append(current_token)
         return tokens
 
+    #this function lists the edits that turn the original text into the simplified text
+    #every edit has the character offset and length of the changed part of the original, the original and
+    #replacement strings and the reason ("lexicon", "model" or "forced" from the last simplify_text call, otherwise "rewrite")
+    #whitespace-only differences (e.g. newlines joined by simplify_text) are left out
+    #reasons can be passed for a result that was simplified earlier (e.g. a cached one)
+    def compute_edits(self, original, simplified, reasons=None):
+        orig_tokens = self.tokenize_with_punctuation(original)
+        simp_tokens = self.tokenize_with_punctuation(simplified)
+        #character offset of every original token
+        offsets = [0]
+        for token in orig_tokens:
+            offsets.append(offsets[-1] + len(token))
+        if reasons is None:
+            reasons = getattr(self, 'replacement_reasons', {})
+
+        def make_edit(i1, i2, replacement):
+            original_part = ''.join(orig_tokens[i1:i2])
+            return {
+                "offset": offsets[i1],
+                "length": len(original_part),
+                "original": original_part,
+                "replacement": replacement,
+                "reason": reasons.get((original_part.lower(), replacement.lower()), "rewrite")
+            }
+
+        edits = []
+        sm = difflib.SequenceMatcher(None, orig_tokens, simp_tokens, autojunk=False)
+        for tag, i1, i2, j1, j2 in sm.get_opcodes():
+            if tag == "equal":
+                continue
+            #skipping whitespace-only changes
+            if not ''.join(orig_tokens[i1:i2]).strip() and not ''.join(simp_tokens[j1:j2]).strip():
+                continue
+            #word for word replacements get one edit per word
+            if tag == "replace" and i2 - i1 == j2 - j1:
+                for k in range(i2 - i1):
+                    if orig_tokens[i1 + k] != simp_tokens[j1 + k] and (orig_tokens[i1 + k].strip() or simp_tokens[j1 + k].strip()):
+                        edits.append(make_edit(i1 + k, i1 + k + 1, simp_tokens[j1 + k]))
+            else:
+                edits.append(make_edit(i1, i2, ''.join(simp_tokens[j1:j2])))
+        return edits
+
     #this function calculates the readability/difficulty metrics for text
     #used to evaluate the simplification
-    def get_difficulty_metrics(self, text):
+    def get_difficulty_metrics(self, text, profile=None):
         #calculating Flesch Reading Ease
         fre = flesch_reading_ease(text)
 
         #counting difficult words based on frequency
         words = word_tokenize(text.lower()) #tokenizing text
         total_words = len([w for w in words if w.isalpha()]) #counting total words
-        difficult_words = sum(1 for word in words if self.is_difficult_word(word)) #counting difficult words
+        difficult_words = sum(1 for word in words if self.is_difficult_word(word, profile)) #counting difficult words
         difficult_word_percent = (difficult_words / total_words * 100) if total_words > 0 else 0 #calculating difficult word %
 
         #average word length
@@ -792,9 +1618,10 @@ class NLPSimplifier:
             return "Very Difficult - College Graduate"
 
     #this function evaluates the simplification by comparing the metrics
-    def evaluate_simplification(self, original, simplified):
-        original_metrics = self.get_difficulty_metrics(original)
-        simplified_metrics = self.get_difficulty_metrics(simplified)
+    #(profile is passed by callers that evaluate outside the request that loaded it, see app.py)
+    def evaluate_simplification(self, original, simplified, profile=None):
+        original_metrics = self.get_difficulty_metrics(original, profile)
+        simplified_metrics = self.get_difficulty_metrics(simplified, profile)
         fre_diff = simplified_metrics["flesch_reading_ease"] - original_metrics["flesch_reading_ease"]
         difficult_word_percent_diff = original_metrics["difficult_word_percent"] - simplified_metrics[
             "difficult_word_percent"]
@@ -0,0 +1,56 @@
+#coalescing of identical requests that are in flight at the same time (single flight)
+#users of the same tier get passages from the same corpus file, so the same (tier, text) often arrives several times
+#at once (e.g. a class starting an exercise together). the first request runs the simplifier, the others wait for its
+#future and get the same result (or the same exception) instead of queueing for the simplifier with the same work
+#only requests handled by the same process are coalesced (gunicorn threads, not separate workers)
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+
+class SingleFlight:
+    #timeout is how long a duplicate waits for the first request before running on its own (None waits for good)
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.calls = {} #key -> future of the call in flight
+        self.leaders = 0 #calls that ran func
+        self.coalesced = 0 #calls that waited for a call in flight
+        self.timeouts = 0 #duplicates that gave up waiting and ran func themselves
+
+    #this function runs func() for the first caller with a key and lets concurrent callers with the same key share
+    #its result; it returns (result, shared) where shared tells if the result came from another caller
+    #an exception raised by func is raised in every caller that waited for it
+    def do(self, key, func):
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.calls[key] = future
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if leader:
+            try:
+                result = func()
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result(result)
+                return result, False
+            finally:
+                with self.lock:
+                    self.calls.pop(key, None)
+        try:
+            return future.result(self.timeout), True
+        except FutureTimeout:
+            #the first call is taking too long (stuck behind other work), so this one runs on its own
+            with self.lock:
+                self.timeouts += 1
+            return func(), False
+
+    def stats(self):
+        with self.lock:
+            return {"in_flight": len(self.calls), "leaders": self.leaders, "coalesced": self.coalesced,
+                    "timeouts": self.timeouts}
@@ -0,0 +1,139 @@
+#structured (JSON) logging for the simplifier service
+#request threads only put records on a queue; a QueueListener thread formats them and does the I/O,
+#so a request never waits on disk or stdout under the logging lock
+#records can carry a route (extra={"route": "/simplify"}) and are sampled per route; long text fields are cut
+#
+#configured by environment variables:
+#  SIMPLIFIER_LOG_LEVEL      log level (default INFO)
+#  SIMPLIFIER_LOG_FILE       also write to this file (default: stdout only)
+#  SIMPLIFIER_LOG_SAMPLE     per-route sampling rates, e.g. "/simplify=0.1,/health=0" (default: log everything)
+#  SIMPLIFIER_LOG_MAX_FIELD  max characters of a text field (default 200)
+import os
+import sys
+import copy
+import json
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+
+#attributes every LogRecord has (everything else was passed with extra=)
+STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+_listener = None
+
+
+#this function shortens long strings inside a value (also in nested dicts/lists)
+def cap_fields(value, max_chars):
+    if isinstance(value, str) and len(value) > max_chars:
+        return value[:max_chars] + f"...({len(value)} chars)"
+    if isinstance(value, dict):
+        return {key: cap_fields(item, max_chars) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [cap_fields(item, max_chars) for item in value]
+    return value
+
+
+#formats a record as one JSON object per line (the fields passed with extra= become JSON fields)
+class JsonFormatter(logging.Formatter):
+    def __init__(self, max_field_chars=200):
+        super().__init__()
+        self.max_field_chars = max_field_chars
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": cap_fields(record.getMessage(), max(self.max_field_chars, 2000))
+        }
+        for key, value in vars(record).items():
+            if key not in STANDARD_ATTRS and key != 'always_log':
+                entry[key] = cap_fields(value, self.max_field_chars)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+#queue handler that keeps the extra fields and the traceback separate instead of formatting the whole record
+#into one string on the request thread (the default QueueHandler.prepare does that)
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+#keeps only a share of the records of each route
+#warnings/errors and records logged with extra={"always_log": True} are always kept
+class RouteSampler(logging.Filter):
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = rates or {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or getattr(record, 'always_log', False):
+            return True
+        rate = self.rates.get(getattr(record, 'route', None), 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+#this function parses sampling rates like "/simplify=0.1,/health=0"
+def parse_sample_rates(value):
+    rates = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            route, rate = item.split('=', 1)
+            rates[route.strip()] = float(rate)
+    return rates
+
+
+#this function flushes the queued records when the process exits
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+atexit.register(_stop_listener)
+
+
+#this function sets up the root logger: JSON records through a queue to stdout (and a file if given)
+#calling it again replaces the previous setup
+def configure_logging(level=None, log_file=None, sample_rates=None, max_field_chars=None):
+    global _listener
+    level = level or os.environ.get('SIMPLIFIER_LOG_LEVEL', 'INFO')
+    log_file = log_file or os.environ.get('SIMPLIFIER_LOG_FILE')
+    if sample_rates is None:
+        sample_rates = parse_sample_rates(os.environ.get('SIMPLIFIER_LOG_SAMPLE'))
+    if max_field_chars is None:
+        max_field_chars = int(os.environ.get('SIMPLIFIER_LOG_MAX_FIELD', 200))
+
+    if _listener is not None:
+        _listener.stop()
+    formatter = JsonFormatter(max_field_chars)
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(RouteSampler(sample_rates))
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    return _listener
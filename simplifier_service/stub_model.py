@@ -0,0 +1,40 @@
+#deterministic stand-in for the fill-mask pipeline (SIMPLIFIER_STUB_MODEL=1)
+#it needs no model download and answers in constant time, so load tests measure the service
+#(Flask, spaCy, WordNet, our own code) without the transformer's cost
+import time
+import hashlib
+
+#short, common words the stub predicts from
+STUB_VOCABULARY = [
+    'big', 'small', 'new', 'old', 'good', 'bad', 'fast', 'slow', 'hard', 'easy',
+    'clear', 'free', 'full', 'high', 'low', 'kind', 'safe', 'sure', 'main', 'real',
+    'said', 'made', 'used', 'found', 'gave', 'got', 'kept', 'left', 'put', 'ran',
+    'show', 'help', 'keep', 'start', 'stop', 'give', 'take', 'make', 'move', 'try',
+    'idea', 'plan', 'part', 'place', 'way', 'work', 'life', 'home', 'group', 'team'
+]
+
+
+class StubFillMask:
+    #latency_ms adds a fixed delay to every call to imitate the model's cost
+    def __init__(self, mask_token='<mask>', latency_ms=0):
+        self.mask_token = mask_token
+        self.latency_ms = latency_ms
+        self.model = None
+
+    #same call signature and output format as the transformers fill-mask pipeline
+    def __call__(self, masked, top_k=5, **kwargs):
+        if isinstance(masked, list):
+            return [self(text, top_k=top_k) for text in masked]
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        #the same masked sentence always gets the same predictions
+        seed = int(hashlib.md5(masked.encode('utf-8')).hexdigest(), 16)
+        predictions = []
+        for rank in range(min(top_k, len(STUB_VOCABULARY))):
+            word = STUB_VOCABULARY[(seed + rank * 7) % len(STUB_VOCABULARY)]
+            predictions.append({
+                'score': 1.0 / (rank + 2),
+                'token_str': ' ' + word,
+                'sequence': masked.replace(self.mask_token, word, 1)
+            })
+        return predictions
@@ -0,0 +1,157 @@
+#nearest-neighbour index of simpler synonyms for fast mode (replacements without a model forward pass)
+#built offline from the input embeddings of the fill-mask model: for every whole word of the model's vocabulary, the
+#words closest to it by cosine similarity that are simpler for dyslexic readers (is_better_for_dyslexia, and at least
+#as frequent when a SUBTLEX file is given) and, unless --no-wordnet, share a WordNet synset with it
+#the neighbours are saved as numpy matrices (row i = the neighbours of words[i]) which the service memory-maps, so
+#the workers share the pages and loading the index costs almost nothing
+import os
+import json
+import logging
+import numpy as np
+try:
+    from .lexicons import deep_sizeof
+except ImportError:
+    from lexicons import deep_sizeof
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'synonym_index')
+WORDS_FILE = 'words.json'
+NEIGHBOURS_FILE = 'neighbours.npy' #int32 word ids, -1 where a word has fewer neighbours
+SCORES_FILE = 'scores.npy' #float16 cosine similarity of each neighbour
+SIMILARITY_CHUNK = 1024 #rows of the similarity matrix computed at a time while building
+
+
+#word -> simpler neighbours (loaded from a directory written by build_synonym_index)
+class SynonymIndex:
+    def __init__(self, index_dir=INDEX_DIR):
+        with open(os.path.join(index_dir, WORDS_FILE), 'r', encoding='utf-8') as f:
+            self.words = json.load(f)
+        self.rows = {word: row for row, word in enumerate(self.words)}
+        self.neighbour_ids = np.load(os.path.join(index_dir, NEIGHBOURS_FILE), mmap_mode='r')
+        self.scores = np.load(os.path.join(index_dir, SCORES_FILE), mmap_mode='r')
+
+    #this function returns the neighbours of a word as (word, similarity), most similar first
+    def neighbours(self, word):
+        row = self.rows.get(word.lower())
+        if row is None:
+            return []
+        return [(self.words[idx], float(score)) for idx, score in zip(self.neighbour_ids[row], self.scores[row]) if idx >= 0]
+
+    def __len__(self):
+        return len(self.words)
+
+    #the matrices are memory-mapped, so only the word list counts as memory of this process
+    def nbytes(self):
+        return deep_sizeof(self.words) + deep_sizeof(self.rows)
+
+
+#this function loads the index if it was built (None otherwise, fast mode is then unavailable)
+def load_synonym_index(index_dir=INDEX_DIR):
+    if not os.path.exists(os.path.join(index_dir, NEIGHBOURS_FILE)):
+        return None
+    try:
+        return SynonymIndex(index_dir)
+    except (OSError, ValueError) as e:
+        logger.error(f"Error loading synonym index from {index_dir}: {e}")
+        return None
+
+
+#this function gets the whole words of the model's vocabulary and their input embeddings
+#(lowercase alphabetic tokens that start a word, since those are the ones a replacement can be)
+def model_word_embeddings(model_name, function_words):
+    from transformers import AutoTokenizer, AutoModelForMaskedLM
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForMaskedLM.from_pretrained(model_name)
+    embeddings = model.get_input_embeddings().weight.detach().cpu().numpy()
+    words, ids = [], []
+    for token, token_id in sorted(tokenizer.get_vocab().items(), key=lambda item: item[1]):
+        #byte-level BPE marks the start of a word with 'Ġ'
+        if not token.startswith('Ġ'):
+            continue
+        word = token[1:]
+        if word.isalpha() and word.islower() and len(word) > 2 and word not in function_words:
+            words.append(word)
+            ids.append(token_id)
+    return words, embeddings[ids]
+
+
+#this function returns the lowercase single-word WordNet synonyms of a word (all parts of speech)
+def wordnet_synonyms(word):
+    from nltk.corpus import wordnet as wn
+    return {lemma.name().lower() for synset in wn.synsets(word) for lemma in synset.lemmas()
+            if lemma.name().isalpha() and lemma.name().lower() != word}
+
+
+#this function finds the simpler neighbours of every word
+#simplifier is used for its filters (is_better_for_dyslexia, function words, frequencies)
+#it returns the neighbour id and score matrices (words x neighbours)
+def find_neighbours(words, vectors, simplifier, neighbours=10, use_wordnet=True, candidates=200):
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-8)
+    vectors = vectors.astype(np.float32)
+    rows = {word: row for row, word in enumerate(words)}
+    neighbour_ids = np.full((len(words), neighbours), -1, dtype=np.int32)
+    scores = np.zeros((len(words), neighbours), dtype=np.float16)
+    candidates = min(candidates, len(words) - 1)
+    freq_dict = simplifier.freq_dict
+
+    def keep(source, candidate):
+        if candidate in simplifier.function_words or not simplifier.is_better_for_dyslexia(candidate, source):
+            return False
+        #more frequent words are easier to read, so a rarer neighbour isn't simpler
+        return not (candidate in freq_dict and source in freq_dict and freq_dict[candidate] < freq_dict[source])
+
+    for start in range(0, len(words), SIMILARITY_CHUNK):
+        chunk = vectors[start:start + SIMILARITY_CHUNK]
+        similarity = chunk @ vectors.T
+        for offset, row_similarity in enumerate(similarity):
+            row = start + offset
+            source = words[row]
+            if use_wordnet:
+                #ranking the WordNet synonyms that are in the vocabulary by similarity
+                ranked = sorted((rows[synonym] for synonym in wordnet_synonyms(source) if synonym in rows),
+                                key=lambda idx: row_similarity[idx], reverse=True)
+            else:
+                top = np.argpartition(-row_similarity, candidates)[:candidates + 1]
+                ranked = top[np.argsort(-row_similarity[top])]
+            found = 0
+            for idx in ranked:
+                if idx == row or not keep(source, words[idx]):
+                    continue
+                neighbour_ids[row, found] = idx
+                scores[row, found] = row_similarity[idx]
+                found += 1
+                if found == neighbours:
+                    break
+        logger.info(f"Neighbours of {min(start + SIMILARITY_CHUNK, len(words))}/{len(words)} words")
+    return neighbour_ids, scores
+
+
+#this function writes the index (words.json and the two matrices) to a directory
+def save_synonym_index(index_dir, words, neighbour_ids, scores):
+    os.makedirs(index_dir, exist_ok=True)
+    with open(os.path.join(index_dir, WORDS_FILE), 'w', encoding='utf-8') as f:
+        json.dump(words, f)
+    np.save(os.path.join(index_dir, NEIGHBOURS_FILE), neighbour_ids)
+    np.save(os.path.join(index_dir, SCORES_FILE), scores)
+
+
+#command line: building the index (takes a few minutes on a CPU, only needed again when the model or filters change)
+#e.g. python synonym_index.py --neighbours 10 --subtlex data/SUBTLEX.xlsx
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Build the simple-synonym index used by fast mode")
+    parser.add_argument('--model', default='distilroberta-base', help="model whose input embeddings are used")
+    parser.add_argument('--neighbours', type=int, default=10, help="neighbours kept per word")
+    parser.add_argument('--no-wordnet', action='store_true', help="keep any close word, not only WordNet synonyms")
+    parser.add_argument('--subtlex', help="SUBTLEX frequency file (neighbours must then be at least as frequent)")
+    parser.add_argument('--output', default=INDEX_DIR, help="directory to write the index to")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    from simplifier import NLPSimplifier
+    #only the filters are needed, so the stub stands in for the fill-mask pipeline
+    filters = NLPSimplifier(subtlex_path=args.subtlex, stub_model=True)
+    vocabulary, word_vectors = model_word_embeddings(args.model, filters.function_words)
+    ids, similarities = find_neighbours(vocabulary, word_vectors, filters, args.neighbours, not args.no_wordnet)
+    save_synonym_index(args.output, vocabulary, ids, similarities)
+    print(f"{args.output}: {len(vocabulary)} words, {int((ids[:, 0] >= 0).sum())} with at least one simpler neighbour")
@@ -0,0 +1,22 @@
+#shared setup of the service's tests
+import os
+import sys
+import pytest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+#the tests import the service's modules the way app.py does, from the service's directory
+if SERVICE_DIR not in sys.path:
+    sys.path.insert(0, SERVICE_DIR)
+
+
+#the simplifier needs spaCy, transformers and the NLTK data the service downloads
+@pytest.fixture(scope='session')
+def simplifier_dependencies():
+    pytest.importorskip('spacy')
+    pytest.importorskip('transformers')
+    nltk = pytest.importorskip('nltk')
+    for resource in ('tokenizers/punkt', 'corpora/wordnet'):
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            pytest.skip(f"NLTK resource {resource} is not installed")
@@ -0,0 +1,39 @@
+#regression tests: a replacement remembered in the decision memo is only reused where the current sentence allows it
+#(the checks that depend on the sentence, like antonyms in it, run again for every sentence the word is in)
+import os
+import pytest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def simplifier(simplifier_dependencies):
+    spacy = pytest.importorskip('spacy')
+    if not spacy.util.is_package('en_core_web_sm'):
+        pytest.skip("spaCy model en_core_web_sm is not installed")
+    from simplifier import NLPSimplifier
+    return NLPSimplifier(adv_ele_path=os.path.join(SERVICE_DIR, 'data', 'ADV-ELE.txt'), stub_model=True)
+
+
+#this function starts a request whose memo already has a replacement of word (as an earlier sentence would leave it)
+def remember(simplifier, word, pos, replacement):
+    simplifier.reset_request_stats()
+    simplifier.decision_memo = {(word, pos, simplifier.current_tier): replacement}
+
+
+def test_memo_hit_in_a_safe_sentence(simplifier):
+    remember(simplifier, 'happy', 'ADJ', 'glad')
+    assert simplifier.memoized_contextual_replacement("She was happy.", 'happy', 'ADJ') == 'glad'
+    assert simplifier.request_stats["memo_hits"] == 1
+
+
+def test_memo_hit_skipped_when_the_word_has_its_antonym_in_the_sentence(simplifier):
+    remember(simplifier, 'happy', 'ADJ', 'glad')
+    assert simplifier.memoized_contextual_replacement("She was happy but he was unhappy.", 'happy', 'ADJ') is None
+    assert simplifier.request_stats["memo_hits"] == 0
+
+
+def test_memo_hit_skipped_when_the_replacement_has_its_antonym_in_the_sentence(simplifier):
+    remember(simplifier, 'happy', 'ADJ', 'glad')
+    assert simplifier.memoized_contextual_replacement("She was happy, he was sad.", 'happy', 'ADJ') != 'glad'
+    assert simplifier.request_stats["memo_hits"] == 0
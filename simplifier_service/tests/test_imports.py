@@ -0,0 +1,38 @@
+#regression tests: the service modules can be imported as part of the simplifier_service package (backend/api.py does
+#`from simplifier_service.simplifier import NLPSimplifier`) as well as from the service's own directory (app.py)
+#every import runs in a fresh interpreter so the modules one way loaded don't hide a failure of the other
+import os
+import sys
+import subprocess
+import pytest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(SERVICE_DIR)
+#modules that import other modules of the service
+MODULES = ['references', 'synonym_index', 'document', 'shared_state', 'lexicons']
+
+
+def run_import(statement, cwd):
+    return subprocess.run([sys.executable, '-c', statement], cwd=cwd, capture_output=True, text=True, timeout=600)
+
+
+@pytest.mark.parametrize('module', MODULES)
+def test_module_imports_as_package(module):
+    result = run_import(f"import simplifier_service.{module}", REPO_DIR)
+    assert result.returncode == 0, result.stderr
+
+
+@pytest.mark.parametrize('module', MODULES)
+def test_module_imports_from_service_directory(module):
+    result = run_import(f"import {module}", SERVICE_DIR)
+    assert result.returncode == 0, result.stderr
+
+
+def test_simplifier_imports_as_package(simplifier_dependencies):
+    result = run_import("from simplifier_service.simplifier import NLPSimplifier", REPO_DIR)
+    assert result.returncode == 0, result.stderr
+
+
+def test_simplifier_imports_from_service_directory(simplifier_dependencies):
+    result = run_import("from simplifier import NLPSimplifier", SERVICE_DIR)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,114 @@
+#serving settings tuned for the machine (written by autotune.py, read at boot by gunicorn.conf.py and app.py)
+#tuning.json has the gunicorn worker/thread counts, the torch intra-op thread count and document mode's process count
+#per worker and the spaCy and inference batch sizes. without the file the service runs one worker and gives it all the cores; the environment
+#variables below override single settings (e.g. while autotune.py tries a configuration)
+#it can also have the difficulty gate of each tier (written by evaluate.py --tune-gates)
+import os
+import json
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+TUNING_FILE = os.path.join(BASE_PATH, 'tuning.json')
+
+#settings -> default (torch_threads and document_workers None mean cores / workers)
+DEFAULTS = {
+    "workers": 1,
+    "threads": 1,
+    "torch_threads": None,
+    "document_workers": None,
+    "spacy_batch_size": 1,
+    "inference_batch_size": 1
+}
+#settings -> environment variable that overrides it
+ENV_OVERRIDES = {
+    "workers": 'WEB_CONCURRENCY',
+    "threads": 'SIMPLIFIER_THREADS',
+    "torch_threads": 'SIMPLIFIER_TORCH_THREADS',
+    "document_workers": 'SIMPLIFIER_DOCUMENT_WORKERS',
+    "spacy_batch_size": 'SIMPLIFIER_SPACY_BATCH',
+    "inference_batch_size": 'SIMPLIFIER_INFERENCE_BATCH'
+}
+#difficulty gate of each tier (see NLPSimplifier.gate_candidates); None turns that part of the gate off
+#there is no gate by default, evaluate.py --tune-gates measures which gate keeps the quality of the ungated run
+NO_GATE = {"min_score": None, "top_fraction": None}
+GATE_ENV_OVERRIDES = {
+    "adv-ele": 'SIMPLIFIER_GATE_BEGINNER',
+    "adv-int": 'SIMPLIFIER_GATE_INTERMEDIATE'
+}
+
+
+#this function reads a gate from an environment variable: "min_score" or "min_score,top_fraction"
+#("off" turns the gate off, an empty part leaves it out, e.g. ",0.5")
+def parse_gate(value):
+    if value.strip().lower() in ('off', 'none', '0'):
+        return dict(NO_GATE)
+    parts = [part.strip() for part in value.split(',')]
+    if len(parts) > 2:
+        raise ValueError(f"Invalid difficulty gate: {value}")
+    min_score = float(parts[0]) if parts[0] else None
+    top_fraction = float(parts[1]) if len(parts) > 1 and parts[1] else None
+    return {"min_score": min_score, "top_fraction": top_fraction}
+
+
+#this function reads the tuned settings (SIMPLIFIER_TUNING_FILE or tuning.json next to this file)
+#a missing or unreadable file just gives the defaults
+def load_tuning(path=None):
+    path = path or os.environ.get('SIMPLIFIER_TUNING_FILE', TUNING_FILE)
+    settings = dict(DEFAULTS)
+    gates = {tier: dict(NO_GATE) for tier in GATE_ENV_OVERRIDES}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            tuned = json.load(f)
+        settings.update({key: tuned[key] for key in DEFAULTS if key in tuned})
+        for tier, gate in (tuned.get("difficulty_gates") or {}).items():
+            gates[tier] = {key: gate.get(key) for key in NO_GATE}
+    except (OSError, ValueError):
+        pass
+    for key, env_name in ENV_OVERRIDES.items():
+        if os.environ.get(env_name):
+            settings[key] = int(os.environ[env_name])
+    for tier, env_name in GATE_ENV_OVERRIDES.items():
+        if os.environ.get(env_name):
+            gates[tier] = parse_gate(os.environ[env_name])
+    settings["difficulty_gates"] = gates
+    #each worker gets its share of the cores so the workers' thread pools (and document mode's worker processes)
+    #don't oversubscribe the CPU
+    core_share = max(1, (os.cpu_count() or 1) // max(settings["workers"], 1))
+    if not settings["torch_threads"]:
+        settings["torch_threads"] = core_share
+    if not settings["document_workers"]:
+        settings["document_workers"] = core_share
+    return settings
+
+
+#this function applies the per-process settings to the simplifier (torch threads, batch sizes, difficulty gates)
+def apply_tuning(simplifier, settings):
+    try:
+        import torch
+        torch.set_num_threads(settings["torch_threads"])
+    except ImportError:
+        pass
+    simplifier.spacy_batch_size = max(1, settings["spacy_batch_size"])
+    simplifier.inference_batch_size = max(1, settings["inference_batch_size"])
+    for tier, gate in settings.get("difficulty_gates", {}).items():
+        simplifier.set_difficulty_gate(tier, gate["min_score"], gate["top_fraction"])
+
+
+#this function reads the tuning file as it is (no defaults or environment overrides, {} if there is none)
+def read_tuning_file(path=None):
+    path = path or os.environ.get('SIMPLIFIER_TUNING_FILE', TUNING_FILE)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+#this function writes settings into the tuning file, keeping the ones other tools wrote there
+#(autotune.py writes the serving settings, evaluate.py the difficulty gates)
+def save_tuning(updates, path=None):
+    path = path or os.environ.get('SIMPLIFIER_TUNING_FILE', TUNING_FILE)
+    tuning = read_tuning_file(path)
+    tuning.update(updates)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(tuning, f, indent=2)
+    return tuning
@@ -0,0 +1,193 @@
+#background warm-up of the passages a tier's daily exercises are picked from
+#when a tier is set (e.g. right after the diagnostic) a low-priority thread pre-simplifies a rolling window of
+#random candidate passages from that tier's corpus file into the result cache; the daily exercise prefers
+#passages from the window (GET /warm-passages) so it is served from the cache, and every served passage is
+#replaced by a new one
+#
+#the simplifier is shared, so live requests and the warm-up take turns through a PriorityLock:
+#live requests always go first and the warm-up only starts a passage when no live request is running or waiting
+import os
+import time
+import random
+import logging
+import threading
+from collections import OrderedDict
+from word_map_builder import iter_corpus_pairs
+from result_cache import result_key, snapshot_result
+
+logger = logging.getLogger(__name__)
+
+#service tier -> the simplifier's current_tier value for it
+SIMPLIFIER_TIERS = {'beginner': 'adv-ele', 'intermediate': 'adv-int', 'advanced': 'advanced'}
+
+
+#lock with two priorities: a waiting live request always gets the lock before background work
+class PriorityLock:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.held = False
+        self.live_waiting = 0
+
+    #timeout (seconds) stops waiting after that long, acquire then returns False
+    def acquire(self, background=False, timeout=None):
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self.condition:
+            if not background:
+                self.live_waiting += 1
+            try:
+                while self.held or (background and self.live_waiting):
+                    remaining = deadline - time.monotonic() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        #background work may have been waiting for this request only
+                        self.condition.notify_all()
+                        return False
+                    self.condition.wait(remaining)
+            finally:
+                if not background:
+                    self.live_waiting -= 1
+            self.held = True
+            return True
+
+    def release(self):
+        with self.condition:
+            self.held = False
+            self.condition.notify_all()
+
+    def live(self):
+        return _Holding(self, background=False)
+
+    def background(self):
+        return _Holding(self, background=True)
+
+
+class _Holding:
+    def __init__(self, lock, background):
+        self.lock = lock
+        self.is_background = background
+
+    def __enter__(self):
+        self.lock.acquire(self.is_background)
+        return self
+
+    def __exit__(self, *exc):
+        self.lock.release()
+        return False
+
+
+#this function lists the passages a tier's daily exercise can pick
+#(the advanced sentence of every corpus pair where both sentences have at least min_words words, like backend/server.js)
+def candidate_passages(file_path, min_words=10):
+    passages = []
+    if os.path.exists(file_path):
+        for adv_sent, ele_sent, _ in iter_corpus_pairs(file_path):
+            if len(adv_sent.split()) >= min_words and len(ele_sent.split()) >= min_words:
+                passages.append(adv_sent)
+    return passages
+
+
+#keeps `window` pre-simplified passages ready for every tier that was set
+class PassageWarmer:
+    #tier_files maps a tier ('beginner', 'intermediate') to its corpus file
+    def __init__(self, simplifier, lock, cache, tier_files, window=8, min_words=10, seed=None):
+        self.simplifier = simplifier
+        self.lock = lock
+        self.cache = cache
+        self.tier_files = tier_files
+        self.window = window
+        self.min_words = min_words
+        self.rng = random.Random(seed)
+        self.candidates = {} #tier -> shuffled passages not tried yet
+        self.warm = {} #tier -> passages in the cache that haven't been served yet (in warm-up order)
+        self.state_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    #this function starts (or tops up) the warm-up of a tier
+    #(not with the result cache off: the warm passages are only warm while they are in the cache, so without one the
+    #warm-up would keep simplifying the same passages again)
+    def start(self, tier):
+        if self.window <= 0 or self.cache.max_entries <= 0 or tier not in self.tier_files:
+            return False
+        with self.state_lock:
+            self.warm.setdefault(tier, OrderedDict())
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name="passage-warmer", daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+        return True
+
+    #this function returns the warm passages of a tier (oldest first)
+    def warm_passages(self, tier):
+        with self.state_lock:
+            return list(self.warm.get(tier, ()))
+
+    #this function takes a served passage out of the window so the warm-up replaces it
+    def mark_served(self, tier, text):
+        with self.state_lock:
+            passages = self.warm.get(tier)
+            if passages is None or text not in passages:
+                return
+            del passages[text]
+        self.wakeup.set()
+
+    def stats(self):
+        with self.state_lock:
+            return {tier: len(passages) for tier, passages in self.warm.items()}
+
+    #this function picks the next passage to warm up, or None when every window is full
+    def next_passage(self):
+        with self.state_lock:
+            for tier, passages in self.warm.items():
+                #passages that dropped out of the cache don't count as warm
+                for text in [t for t in passages if result_key(tier, t) not in self.cache]:
+                    del passages[text]
+                if len(passages) >= self.window:
+                    continue
+                if not self.candidates.get(tier):
+                    candidates = candidate_passages(self.tier_files[tier], self.min_words)
+                    self.rng.shuffle(candidates)
+                    self.candidates[tier] = candidates
+                while self.candidates[tier]:
+                    text = self.candidates[tier].pop()
+                    if text not in passages:
+                        return tier, text
+        return None
+
+    #the warm-up thread: simplifies one passage at a time at low priority
+    def run(self):
+        try:
+            #lowest scheduling priority for this thread (Linux applies it per thread)
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        while True:
+            item = self.next_passage()
+            if item is None:
+                self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+            tier, text = item
+            key = result_key(tier, text)
+            try:
+                if key not in self.cache:
+                    with self.lock.background():
+                        result = self.simplify_for_tier(tier, text)
+                    self.cache.put(key, result)
+                with self.state_lock:
+                    self.warm[tier][text] = True
+            except Exception as e:
+                logger.error(f"Warm-up of a {tier} passage failed: {e}", exc_info=True)
+
+    #this function simplifies a passage with a tier's settings and puts the simplifier's tier back afterwards
+    #(the caller holds the lock)
+    def simplify_for_tier(self, tier, text):
+        previous_tier = self.simplifier.current_tier
+        switch = SIMPLIFIER_TIERS.get(tier, tier) != previous_tier
+        if switch:
+            self.simplifier.set_simplification_tier(tier)
+        try:
+            simplified_text, records = self.simplifier.simplify_text_with_records(text)
+            return snapshot_result(self.simplifier, simplified_text, records)
+        finally:
+            if switch:
+                self.simplifier.set_simplification_tier(previous_tier)
@@ -0,0 +1,188 @@
+#streaming, parallel and incremental counting of word substitutions in the aligned corpora (ADV-ELE/ADV-INT)
+#every pair in a corpus file is an advanced line followed by its simplified line, and pairs are separated by a line of *'s
+#pairs are read lazily, aligned with difflib across a process pool and the counts are merged (map-reduce)
+#the counts and how far into the file they go are saved next to the corpus file so when new pairs are
+#appended only the new pairs are aligned the next time
+import os
+import json
+import hashlib
+import difflib
+import logging
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from nltk.tokenize import word_tokenize
+
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 1
+HEAD_BYTES = 4096 #bytes at the start of the file used to notice that a corpus file was replaced (not appended to)
+CHUNK_PAIRS = 2000 #pairs sent to a worker process at a time
+MIN_PARALLEL_BYTES = 8 * 1024 * 1024 #below this much new text a process pool costs more than it saves
+
+
+#this function gets the path of the saved pair counts for a corpus file
+def pair_counts_path(file_path):
+    return file_path + '.pairs.json'
+
+
+#this function checks if a line is a pair separator (a line of *'s)
+def is_separator(line):
+    stripped = line.strip()
+    return len(stripped) >= 5 and not stripped.strip(b'*')
+
+
+#this function lazily reads the pairs of a corpus file starting at a byte offset
+#it yields (advanced sentence, simplified sentence, offset after the pair's separator)
+#a pair only counts as complete once its separator line is written, so a half-appended pair at the end is left for later
+def iter_corpus_pairs(file_path, start_offset=0):
+    with open(file_path, 'rb') as f:
+        f.seek(start_offset)
+        offset = start_offset
+        block = []
+        for line in f:
+            offset += len(line)
+            if is_separator(line):
+                lines = [l for l in (raw.decode('utf-8').strip() for raw in block) if l]
+                block = []
+                if len(lines) == 2:
+                    yield lines[0], lines[1], offset
+                continue
+            block.append(line)
+
+
+#this function aligns advanced/simplified pairs and counts one-word substitutions (the map step)
+#it runs in worker processes, so it only gets plain data
+def align_pairs(pairs, function_words):
+    counts = Counter()
+    for adv_sent, ele_sent in pairs:
+        adv_words = word_tokenize(adv_sent.lower())
+        ele_words = word_tokenize(ele_sent.lower())
+        sm = difflib.SequenceMatcher(None, adv_words, ele_words)
+        for tag, i1, i2, j1, j2 in sm.get_opcodes():
+            if tag == "replace" and i2 - i1 == 1 and j2 - j1 == 1:
+                adv_word = adv_words[i1]
+                ele_word = ele_words[j1]
+                if (not adv_word.isalpha() or not ele_word.isalpha() or
+                        adv_word in function_words or ele_word in function_words):
+                    continue
+                if adv_word != ele_word:
+                    counts[(adv_word, ele_word)] += 1
+    return counts
+
+
+#this function groups the pairs into chunks for the workers
+def iter_chunks(pairs, size=CHUNK_PAIRS):
+    chunk = []
+    for adv_sent, ele_sent, _ in pairs:
+        chunk.append((adv_sent, ele_sent))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+#this function counts the substitutions of all pairs of a corpus file after start_offset
+#it returns the counts and the offset after the last complete pair
+def count_pairs(file_path, function_words, start_offset=0, workers=None):
+    end = {'offset': start_offset}
+    def tracked_pairs():
+        for adv_sent, ele_sent, offset in iter_corpus_pairs(file_path, start_offset):
+            end['offset'] = offset
+            yield adv_sent, ele_sent, offset
+
+    function_words = frozenset(function_words)
+    counts = Counter()
+    pending_bytes = os.path.getsize(file_path) - start_offset
+    if workers is None:
+        workers = (os.cpu_count() or 1) if pending_bytes >= MIN_PARALLEL_BYTES else 1
+    if workers <= 1:
+        for chunk in iter_chunks(tracked_pairs()):
+            counts.update(align_pairs(chunk, function_words))
+        return counts, end['offset']
+
+    #reduce step: merging the counts in the order the chunks were read so ties are broken like a serial run
+    #(at most 2 chunks per worker are in flight so the corpus is never fully in memory)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = []
+        for chunk in iter_chunks(tracked_pairs()):
+            in_flight.append(pool.submit(align_pairs, chunk, function_words))
+            if len(in_flight) >= workers * 2:
+                counts.update(in_flight.pop(0).result())
+        for future in in_flight:
+            counts.update(future.result())
+    return counts, end['offset']
+
+
+#this function hashes the start of a file
+def file_head_hash(file_path):
+    with open(file_path, 'rb') as f:
+        return hashlib.sha1(f.read(HEAD_BYTES)).hexdigest()
+
+
+#this function loads saved pair counts if they still match the corpus file (otherwise None)
+def load_state(state_path, file_path):
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get('version') != STATE_VERSION or state.get('offset', 0) > os.path.getsize(file_path):
+        return None
+    #the file was rewritten instead of appended to
+    if state.get('head') != file_head_hash(file_path) and state.get('offset', 0) > 0:
+        return None
+    return state
+
+
+#this function saves the pair counts (written to a temporary file first so a crash can't leave half a file; the
+#temporary name is per process because every worker may save the same state when it builds the word map)
+def save_state(state_path, file_path, offset, counts):
+    state = {
+        'version': STATE_VERSION,
+        'offset': offset,
+        'head': file_head_hash(file_path),
+        'counts': [[src, tgt, count] for (src, tgt), count in counts.items()]
+    }
+    tmp_path = f"{state_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
+    except OSError as e:
+        logger.warning(f"Could not save pair counts to {state_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+#this function returns the substitution counts for a corpus file
+#saved counts are reused and only pairs appended since then are aligned and merged in
+def update_pair_counts(file_path, function_words, workers=None, state_path=None):
+    state_path = state_path or pair_counts_path(file_path)
+    state = load_state(state_path, file_path)
+    counts = Counter()
+    offset = 0
+    if state:
+        counts.update({(src, tgt): count for src, tgt, count in state['counts']})
+        offset = state['offset']
+    new_counts, new_offset = count_pairs(file_path, function_words, offset, workers)
+    if new_offset != offset or not state:
+        logger.info(f"Aligned {file_path} from byte {offset} to {new_offset}")
+        counts.update(new_counts)
+        save_state(state_path, file_path, new_offset, counts)
+    return counts
+
+
+#command line: pre-computing (or updating) the pair counts of corpus files
+#e.g. python word_map_builder.py data/ADV-ELE.txt data/ADV-INT.txt --workers 8
+if __name__ == '__main__':
+    import argparse
+    from simplifier import FUNCTION_WORDS
+    parser = argparse.ArgumentParser(description="Count word substitutions in aligned corpus files")
+    parser.add_argument('files', nargs='+', help="corpus files (pairs separated by lines of *'s)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores for large files)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    for corpus_file in args.files:
+        pair_counts = update_pair_counts(corpus_file, FUNCTION_WORDS, args.workers)
+        print(f"{corpus_file}: {len(pair_counts)} distinct substitutions")